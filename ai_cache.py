@@ -0,0 +1,126 @@
+"""
+Two-tier cache for AI answers: an in-process LRU with TTL in front of the
+Postgres `ai_cache` table. Keys hash the kind of reading, the prompt-template
+version, the model and the inputs (card or sign, persona fields).
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+import repository
+
+load_dotenv()
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", str(24 * 3600)))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1024"))
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Bounded in-memory LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_memory = LRUCache(AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL_SECONDS)
+_counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "db_errors": 0}
+
+
+def make_key(kind, version, model, **fields):
+    payload = json.dumps(
+        {"kind": kind, "version": version, "model": model, "fields": fields},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get(key, ttl=AI_CACHE_TTL_SECONDS):
+    """Cached text for `key` from either tier, or None. Counts a miss when absent."""
+    text = _memory.get(key)
+    if text is not None:
+        _counters["memory_hits"] += 1
+        return text
+
+    try:
+        text = await repository.get_ai_cache(key)
+    except Exception as e:
+        _counters["db_errors"] += 1
+        logger.error(f"AI cache read error: {e}")
+    if text is not None:
+        _counters["db_hits"] += 1
+        _memory.set(key, text, ttl)
+        return text
+
+    _counters["misses"] += 1
+    return None
+
+
+async def put(key, text, ttl=AI_CACHE_TTL_SECONDS):
+    """Store `text` in both tiers."""
+    _memory.set(key, text, ttl)
+    try:
+        await repository.save_ai_cache(key, text, ttl)
+    except Exception as e:
+        _counters["db_errors"] += 1
+        logger.error(f"AI cache write error: {e}")
+
+
+async def get_or_generate(key, generate, ttl=AI_CACHE_TTL_SECONDS):
+    """Return the cached text for `key`, otherwise await `generate()` and store its result."""
+    text = await get(key, ttl)
+    if text is None:
+        text = await generate()
+        await put(key, text, ttl)
+    return text
+
+
+async def purge_expired(context=None):
+    """Drop expired rows from the Postgres tier. Usable as a job callback."""
+    try:
+        result = await repository.delete_expired_ai_cache()
+        logger.info(f"AI cache purge: {result}, stats {stats()}")
+    except Exception as e:
+        logger.error(f"AI cache purge error: {e}")
+
+
+def stats():
+    """Hit/miss/eviction counters for both tiers."""
+    return {
+        **_counters,
+        "evictions": _memory.evictions,
+        "expirations": _memory.expirations,
+        "memory_entries": len(_memory),
+    }
@@ -0,0 +1,178 @@
+import os
+import asyncio
+import logging
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+from ai_scheduler import INTERACTIVE, ai_scheduler
+from hedging import HedgeStats, LatencyTracker, hedged
+from resilience import CircuitBreaker
+
+load_dotenv()
+TAROT_MODEL = os.getenv("GEMINI_TAROT_MODEL", "gemini-2.5-flash")
+HOROSCOPE_MODEL = os.getenv("GEMINI_HOROSCOPE_MODEL", "gemini-2.0-flash-001")
+AI_DEADLINE_SECONDS = float(os.getenv("AI_DEADLINE_SECONDS", "20"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "60"))
+# Hedging: after the primary model's HEDGE_PERCENTILE latency, race an alternate model
+HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_ENABLED", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MODEL = os.getenv("GEMINI_HEDGE_MODEL")
+# host:port of a plaintext gRPC Gemini endpoint, e.g. benchmarks/fake_gemini.py
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+logger = logging.getLogger(__name__)
+
+def use_endpoint(address=GEMINI_API_ENDPOINT):
+    """Send Gemini calls to a plaintext gRPC endpoint instead of Google. The channel
+    binds to the running event loop, so call this from inside it (e.g. post_init)."""
+    import grpc
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+        GenerativeServiceGrpcAsyncIOTransport,
+    )
+
+    channel = grpc.aio.insecure_channel(address)
+    genai.configure(transport=GenerativeServiceGrpcAsyncIOTransport(channel=channel))
+    logger.info(f"Gemini requests go to {address}")
+
+
+# model name -> CircuitBreaker
+breakers = {}
+
+
+def get_breaker(model_name):
+    breaker = breakers.get(model_name)
+    if breaker is None:
+        breaker = breakers[model_name] = CircuitBreaker(
+            f"gemini:{model_name}", AI_BREAKER_FAILURES, AI_BREAKER_RESET_SECONDS
+        )
+    return breaker
+
+
+# model name -> LatencyTracker of successful requests
+latencies = {}
+hedge_stats = HedgeStats()
+
+
+def get_latency_tracker(model_name):
+    tracker = latencies.get(model_name)
+    if tracker is None:
+        tracker = latencies[model_name] = LatencyTracker()
+    return tracker
+
+
+def alternate_model(model_name):
+    if HEDGE_MODEL and HEDGE_MODEL != model_name:
+        return HEDGE_MODEL
+    return HOROSCOPE_MODEL if model_name == TAROT_MODEL else TAROT_MODEL
+
+
+async def _call(prompt, model_name, deadline):
+    """
+    One Gemini request that already holds a scheduler slot. It must finish within
+    `deadline` seconds; its latency feeds the hedge threshold and failures feed
+    the model's circuit breaker.
+    """
+
+    async def request():
+        started = asyncio.get_running_loop().time()
+        model = genai.GenerativeModel(model_name)
+        response = await asyncio.wait_for(model.generate_content_async(prompt), deadline)
+        get_latency_tracker(model_name).record(asyncio.get_running_loop().time() - started)
+        return response.text.strip()
+
+    return await get_breaker(model_name).call(request)
+
+
+def _queue_timeout(deadline, priority):
+    """Interactive callers have a user waiting on the reply, so their deadline also
+    covers the wait for a scheduler slot; background work may queue as long as needed."""
+    return deadline if priority == INTERACTIVE else None
+
+
+def _remaining(expires, deadline, priority):
+    if priority != INTERACTIVE:
+        return deadline
+    return max(0.0, expires - asyncio.get_running_loop().time())
+
+
+async def _request(prompt, model_name, deadline, priority):
+    """One Gemini request, admitted by the AI scheduler at `priority`. Fails fast
+    with CircuitOpenError, without queueing, while the model's circuit is open."""
+    get_breaker(model_name).check()
+    expires = asyncio.get_running_loop().time() + deadline
+    async with ai_scheduler.slot(priority, _queue_timeout(deadline, priority)):
+        return await _call(prompt, model_name, _remaining(expires, deadline, priority))
+
+
+async def generate_text(
+    prompt, model_name=TAROT_MODEL, deadline=AI_DEADLINE_SECONDS, hedge=True, priority=INTERACTIVE
+):
+    """
+    Run a Gemini request and return the stripped text. With hedging enabled and
+    enough latency samples, a slow primary request is raced against an
+    alternate model once it passes the primary's HEDGE_PERCENTILE latency.
+    The hedge clock starts only once the primary is admitted, since the threshold
+    is request latency, and the backup waits for a scheduler slot of its own.
+    For INTERACTIVE requests `deadline` bounds the whole call, queueing included.
+    """
+    tracker = get_latency_tracker(model_name)
+    if not (HEDGE_ENABLED and hedge and len(tracker) >= HEDGE_MIN_SAMPLES):
+        return await _request(prompt, model_name, deadline, priority)
+
+    get_breaker(model_name).check()
+    backup_model = alternate_model(model_name)
+    expires = asyncio.get_running_loop().time() + deadline
+    async with ai_scheduler.slot(priority, _queue_timeout(deadline, priority)):
+        return await hedged(
+            lambda: _call(prompt, model_name, _remaining(expires, deadline, priority)),
+            lambda: _request(prompt, backup_model, _remaining(expires, deadline, priority), priority),
+            tracker.percentile(HEDGE_PERCENTILE),
+            hedge_stats,
+        )
+
+
+def stats():
+    """Latency per model, hedging outcomes and circuit states, for tuning the hedge threshold."""
+    return {
+        "latency": {model: tracker.summary() for model, tracker in latencies.items()},
+        "hedging": hedge_stats.summary(),
+        "breakers": {model: breaker.state for model, breaker in breakers.items()},
+        "scheduler": ai_scheduler.stats(),
+    }
+
+
+async def stream_text(prompt, model_name=TAROT_MODEL, deadline=AI_DEADLINE_SECONDS, priority=INTERACTIVE):
+    """
+    Streaming Gemini request holding one scheduler slot until the stream ends;
+    yields text chunks as they arrive. The whole stream must finish within
+    `deadline` seconds, which for interactive callers includes the slot wait.
+    """
+    breaker = get_breaker(model_name)
+    breaker.check()
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + deadline
+
+    async def open_stream():
+        model = genai.GenerativeModel(model_name)
+        return await asyncio.wait_for(
+            model.generate_content_async(prompt, stream=True), max(0.0, expires - loop.time())
+        )
+
+    async with ai_scheduler.slot(priority, _queue_timeout(deadline, priority)):
+        if priority != INTERACTIVE:
+            expires = loop.time() + deadline
+        response = await breaker.call(open_stream)
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, expires - loop.time()))
+            except StopAsyncIteration:
+                break
+            except Exception:
+                breaker.record_failure()
+                raise
+            if chunk.text:
+                yield chunk.text
@@ -1,3 +1,8 @@
+# Bump when a prompt template changes so cached AI answers for the old wording are not reused
+TAROT_PROMPT_VERSION = 1
+HOROSCOPE_PROMPT_VERSION = 1
+
+
 def generate_tarot_prompt(card_name, name=None, gender=None):
     """Generates a short and deep AI prompt for Tarot interpretation with emoji and real quote."""
     personal_info = f" для {gender.lower()} по имени {name}" if name else ""
@@ -18,3 +23,42 @@ def generate_tarot_prompt(card_name, name=None, gender=None):
 
 Не используй списки, Markdown или заголовки. Верни только чистое ироничное предсказание, без пояснений или вводных фраз. Всё должно звучать как единый литературный отрывок, который хочется перечитать, с небольшой, но меткой, улыбкой.
 """
+
+
+def generate_tarot_batch_prompt(entries):
+    """
+    Prompt for interpreting several cards in one request.
+    `entries` is a list of (id, card_name); the answer must be a JSON array of {"id", "text"}.
+    """
+    cards_list = "\n".join(f"{entry_id}. {card_name}" for entry_id, card_name in entries)
+
+    return f"""
+Ты — циничный, мудрый и слегка уставший от предсказуемости Таролог, который видит иронию судьбы и с улыбкой читает между строк архетипов. Твои послания наполнены философским юмором и пронзительной правдой жизни. Перед тобой раскрыты карты (номер и название):
+
+{cards_list}
+
+Для КАЖДОГО номера сформулируй отдельное ироничное, философское послание по его карте. Если карта встречается несколько раз, каждое послание должно быть другим. Каждое послание включает:
+1. Три коротких предложения, наполненных смыслом, символизмом и лёгкой иронией над человеческой суетой.
+2. ОДИН особенно уместный эмодзи ТОЛЬКО перед первым предложением.
+3. В конце, на новой строке, — реальная цитата, связанная по духу с картой, с именем настоящего автора. Не выдумывай.
+
+Внутри посланий не используй списки, Markdown или заголовки.
+
+🕯️ Формат ответа: только JSON-массив без пояснений и без обрамления кодом, по одному объекту на каждый номер:
+[{{"id": 1, "text": "..."}}, {{"id": 2, "text": "..."}}]
+"""
+
+
+def generate_horoscope_prompt(sign):
+    """Generates a daily horoscope prompt for a zodiac sign."""
+    return f"""
+Ты — опытный астролог с лёгким чувством юмора. Составь гороскоп на сегодня для знака *{sign}*.
+
+Опиши в нескольких коротких абзацах:
+1. Общую энергию дня и влияние планет.
+2. Любовь и отношения.
+3. Работу и финансы.
+4. Один практический совет на день.
+
+Пиши живо и образно, без заголовков и без списков. Верни только текст гороскопа, без пояснений или вводных фраз.
+"""
@@ -0,0 +1,121 @@
+"""
+Central admission control for Gemini calls. Every request waits for a slot in
+its priority class; slots are granted strictly by priority (interactive before
+pre-generation before broadcast), within per-class concurrency caps and a
+shared requests-per-minute budget.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+from rate_limit import TokenBucket
+
+load_dotenv()
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+
+INTERACTIVE = "interactive"
+PREGEN = "pregen"
+BROADCAST = "broadcast"
+PRIORITIES = (INTERACTIVE, PREGEN, BROADCAST)
+
+DEFAULT_CONCURRENCY = {
+    INTERACTIVE: int(os.getenv("AI_MAX_CONCURRENCY_INTERACTIVE", "8")),
+    PREGEN: int(os.getenv("AI_MAX_CONCURRENCY_PREGEN", "2")),
+    BROADCAST: int(os.getenv("AI_MAX_CONCURRENCY_BROADCAST", "4")),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class AIScheduler:
+    def __init__(self, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE, concurrency=None):
+        self.budget = TokenBucket(requests_per_minute / 60)
+        self.concurrency = dict(concurrency or DEFAULT_CONCURRENCY)
+        self._waiters = {priority: deque() for priority in PRIORITIES}
+        self._active = {priority: 0 for priority in PRIORITIES}
+        self._granted = {priority: 0 for priority in PRIORITIES}
+        self._wait_seconds = {priority: 0.0 for priority in PRIORITIES}
+        self._wakeup = None
+
+    def _next_class(self):
+        for priority in PRIORITIES:
+            if self._waiters[priority] and self._active[priority] < self.concurrency[priority]:
+                return priority
+        return None
+
+    def _dispatch(self):
+        while True:
+            priority = self._next_class()
+            if priority is None:
+                return
+            future, enqueued = self._waiters[priority][0]
+            if future.cancelled():
+                self._waiters[priority].popleft()
+                continue
+            if not self.budget.try_acquire():
+                self._schedule_wakeup(self.budget.time_until_available())
+                return
+            self._waiters[priority].popleft()
+            self._active[priority] += 1
+            self._granted[priority] += 1
+            self._wait_seconds[priority] += time.monotonic() - enqueued
+            future.set_result(None)
+
+    def _schedule_wakeup(self, delay):
+        if self._wakeup is None or self._wakeup.cancelled():
+            loop = asyncio.get_running_loop()
+            self._wakeup = loop.call_later(delay, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
+
+    async def acquire(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append((future, time.monotonic()))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just before the caller was cancelled: hand the slot back
+            if future.done() and not future.cancelled():
+                self.release(priority)
+            raise
+
+    def release(self, priority):
+        self._active[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority=INTERACTIVE, timeout=None):
+        """Hold one Gemini request slot of `priority` for the duration of the block.
+        With `timeout`, raise asyncio.TimeoutError if no slot is granted in time."""
+        await asyncio.wait_for(self.acquire(priority), timeout)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self):
+        """Queue depth, in-flight calls, grants and mean queueing delay per class."""
+        return {
+            priority: {
+                "queued": sum(1 for future, _ in self._waiters[priority] if not future.done()),
+                "active": self._active[priority],
+                "limit": self.concurrency[priority],
+                "granted": self._granted[priority],
+                "mean_wait_s": round(
+                    self._wait_seconds[priority] / self._granted[priority], 3
+                ) if self._granted[priority] else 0.0,
+            }
+            for priority in PRIORITIES
+        }
+
+
+# Every Gemini call in the process goes through this scheduler
+ai_scheduler = AIScheduler()
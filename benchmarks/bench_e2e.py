@@ -0,0 +1,295 @@
+"""
+End-to-end benchmark of the bot against a local fake Bot API, a local fake
+Gemini and a seeded Postgres database. The real handlers, outbox, limiter and
+data layer run unmodified; only the network endpoints are fakes.
+
+Scenarios:
+  broadcast    pre-generate, enqueue every timezone and drain the outbox:
+               deliveries/s, outcome counts, DB round trips per delivery
+  interactive  /tarot, /subscribe, /horoscope and zodiac button presses:
+               p50/p90/p99 latency under concurrency, DB round trips per update
+
+Results are printed and written as JSON (with the git commit) for comparison
+between commits. The database is TRUNCATED: use a throwaway one.
+
+    python -m benchmarks.bench_e2e --database-url postgresql://localhost/tarot_bench \\
+        --users 5000 --timezones 8 --api-flood-rate 0.01 --gemini-latency 0.5
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from benchmarks.bench_update_latency import summarize
+from benchmarks.fake_gemini import FakeGemini
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeBotAPI, dumps
+
+INTERACTIVE_COMMANDS = ("/tarot", "/subscribe", "/horoscope", "callback:zodiac_Овен")
+DB_PROBE_UPDATES = 40
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure_environment(args, api, gemini):
+    """Point the bot's module-level settings at the fakes. Must run before `import bot`."""
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": FAKE_TOKEN,
+        "TELEGRAM_API_BASE_URL": api.base_url,
+        "GEMINI_API_KEY": "fake",
+        "GEMINI_API_ENDPOINT": gemini.address,
+        "DATABASE_URL2": args.database_url,
+        "TAROT_STREAMING": "1" if args.streaming else "0",
+        # Everyone due at once: measure raw throughput, not the smoothing window
+        "DELIVERY_WINDOW_MINUTES": "0",
+        "OUTBOX_POLL_SECONDS": "0.1",
+        "OUTBOX_BACKOFF_BASE_SECONDS": "0.5",
+        "OUTBOX_BACKOFF_MAX_SECONDS": "2",
+        "AI_STATS_LOG_SECONDS": "86400",
+    })
+
+
+class QueryCounter:
+    """asyncpg query logger counting round trips on every pooled connection."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, record):
+        self.count += 1
+
+    async def install(self, connection):
+        connection.add_query_logger(self)
+
+
+async def run_broadcast(bot, application, rows, queries, pregen, timeout):
+    import outbox
+    import repository
+
+    day = datetime.now(timezone.utc).date()
+    timezones = sorted({tz or "Europe/London" for _, _, _, subscribed, tz in rows if subscribed})
+    subscribers = sum(1 for row in rows if row[3])
+    result = {"subscribers": subscribers, "timezones": len(timezones), "pregen": pregen}
+
+    if pregen:
+        started = time.perf_counter()
+        await bot.pregen_tarot_job(SimpleNamespace(job=SimpleNamespace(data={"day": day})))
+        result["pregen_s"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    for tz_name in timezones:
+        data = {"timezone": tz_name, "day": day, "due": now}
+        await bot.daily_tarot_job(SimpleNamespace(job=SimpleNamespace(data=data)))
+    result["enqueue_s"] = round(time.perf_counter() - started, 3)
+
+    queries_before = queries.count
+    started = time.perf_counter()
+    pool = repository.get_pool()
+    # The real outbox worker drains it, as in production
+    outbox.start_worker(
+        lambda user_id, delivery_day: bot.deliver_daily_tarot(application.bot, user_id, delivery_day)
+    )
+    polls = 0
+    try:
+        while time.perf_counter() - started < timeout:
+            await asyncio.sleep(0.1)
+            polls += 1
+            outstanding = await pool.fetchval(
+                "SELECT count(*) FROM delivery_outbox WHERE status IN ('pending', 'sending')"
+            )
+            if not outstanding:
+                break
+    finally:
+        await outbox.stop_worker()
+    elapsed = time.perf_counter() - started
+    drain_queries = queries.count - queries_before - polls
+
+    outcomes = dict(await pool.fetch("SELECT status, count(*) FROM delivery_outbox GROUP BY status"))
+    sent = outcomes.get("sent", 0)
+    result.update({
+        "drain_s": round(elapsed, 3),
+        "timed_out": elapsed >= timeout,
+        "outcomes": outcomes,
+        "deliveries_per_s": round(sent / elapsed, 2) if elapsed else None,
+        "db_queries_per_delivery": round(drain_queries / max(1, sum(outcomes.values())), 3),
+        "outbox": outbox.stats(),
+    })
+    return result
+
+
+async def run_interactive(application, api, rows, queries, updates, concurrency, seed):
+    from telegram import Update
+
+    rng = random.Random(seed)
+    user_ids = [row[0] for row in rows]
+    plan = [(rng.choice(user_ids), INTERACTIVE_COMMANDS[i % len(INTERACTIVE_COMMANDS)]) for i in range(updates)]
+
+    def to_update(chat_id, command):
+        return Update.de_json(api.make_update(chat_id, command), application.bot)
+
+    # Sequential pass: exact DB round trips per update, by command
+    per_command_queries = {}
+    for chat_id, command in plan[:DB_PROBE_UPDATES]:
+        before = queries.count
+        await application.process_update(to_update(chat_id, command))
+        per_command_queries.setdefault(command, []).append(queries.count - before)
+
+    # Concurrent pass: latency of complete handler runs under load
+    latencies = {command: [] for command in INTERACTIVE_COMMANDS}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(chat_id, command):
+        async with semaphore:
+            started = time.perf_counter()
+            await application.process_update(to_update(chat_id, command))
+            latencies[command].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(chat_id, command) for chat_id, command in plan))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "updates": updates,
+        "concurrency": concurrency,
+        "updates_per_s": round(updates / elapsed, 2),
+        "latency": {command: summarize(values) for command, values in latencies.items() if values},
+        "all": summarize([value for values in latencies.values() for value in values]),
+        "db_queries_per_update": {
+            command: round(sum(counts) / len(counts), 2) for command, counts in per_command_queries.items()
+        },
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="throwaway Postgres database (or BENCH_DATABASE_URL)")
+    parser.add_argument("--scenarios", nargs="+", default=["broadcast", "interactive"],
+                        choices=["broadcast", "interactive"])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--timezones", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--blocked-rate", type=float, default=0.02, help="share of chats that blocked the bot")
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--api-flood-rate", type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument("--api-retry-after", type=int, default=1)
+    parser.add_argument("--gemini-latency", type=float, default=0.3)
+    parser.add_argument("--gemini-jitter", type=float, default=0.1)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-quota-rate", type=float, default=0.0, help="share answered RESOURCE_EXHAUSTED")
+    parser.add_argument("--no-pregen", dest="pregen", action="store_false",
+                        help="broadcast with live generation instead of the pre-generated pool")
+    parser.add_argument("--streaming", action="store_true", help="stream /tarot captions")
+    parser.add_argument("--updates", type=int, default=200, help="interactive updates")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=600, help="broadcast drain limit, seconds")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url or BENCH_DATABASE_URL is required (the database is truncated)")
+
+    api = await FakeBotAPI(
+        latency=args.api_latency,
+        error_rate=args.api_error_rate,
+        flood_rate=args.api_flood_rate,
+        retry_after=args.api_retry_after,
+        seed=args.seed,
+    ).start()
+    gemini = await FakeGemini(
+        latency=args.gemini_latency,
+        jitter=args.gemini_jitter,
+        error_rate=args.gemini_error_rate,
+        quota_rate=args.gemini_quota_rate,
+        seed=args.seed,
+    ).start()
+    try:
+        results = await run(args, api, gemini)
+    finally:
+        await gemini.stop()
+        await api.stop()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(dumps(results))
+    print(dumps(results))
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+async def run(args, api, gemini):
+    # The bot reads its settings from the environment at import time
+    configure_environment(args, api, gemini)
+    import bot
+    import outbox
+    import repository
+    from benchmarks.fixtures import seed_database
+
+    queries = QueryCounter()
+    # Opened with the query counter first; post_init's init_pool then reuses it
+    await repository.init_pool(init=queries.install)
+    application = bot.build_application()
+    initialized = False
+    try:
+        await application.initialize()
+        initialized = True
+        # The real startup: endpoint, migrations, image store, leader lock, outbox worker
+        await bot.post_init(application)
+        # Idle until the broadcast scenario, so its polling does not count against other phases
+        await outbox.stop_worker()
+        rows, blocked = await seed_database(
+            args.users, args.timezones, args.seed, blocked_rate=args.blocked_rate
+        )
+        api.blocked_chats = blocked
+        return await run_scenarios(args, api, gemini, bot, application, rows, blocked, queries)
+    finally:
+        if initialized:
+            # Copes with a partial post_init: every step it undoes is a no-op if never done
+            await bot.post_shutdown(application)
+            await application.shutdown()
+        await repository.close_pool()
+
+
+async def run_scenarios(args, api, gemini, bot, application, rows, blocked, queries):
+    import ai_client
+    from broadcast import telegram_rate_limiter
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "args": {key: value for key, value in vars(args).items() if key != "database_url"},
+        },
+        "fixture": {"users": len(rows), "blocked": len(blocked)},
+    }
+    if "interactive" in args.scenarios:
+        results["interactive"] = await run_interactive(
+            application, api, rows, queries, args.updates, args.concurrency, args.seed
+        )
+    if "broadcast" in args.scenarios:
+        results["broadcast"] = await run_broadcast(
+            bot, application, rows, queries, args.pregen, args.timeout
+        )
+    results["telegram"] = {
+        "calls": api.calls, "injected": api.injected, "limiter": telegram_rate_limiter.stats()
+    }
+    results["gemini"] = {"calls": gemini.calls, "injected": gemini.injected, "client": ai_client.stats()}
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Update-to-reply latency, polling vs webhook, against the local fake Bot API.
+The handler replies immediately, so the numbers isolate the update transport.
+
+    python -m benchmarks.bench_update_latency --updates 200 --api-latency 0.01
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+from telegram.ext import Application, CommandHandler
+
+from benchmarks.fake_telegram import FAKE_TOKEN, FakeBotAPI, dumps
+from webhook import WebhookServer
+
+SECRET = "bench-secret"
+
+
+async def ping(update, context):
+    await update.message.reply_text("pong")
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(percentile(50) * 1000, 2),
+        "p90_ms": round(percentile(90) * 1000, 2),
+        "p99_ms": round(percentile(99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+async def measure(api, updates):
+    latencies = []
+    for i in range(updates):
+        chat_id = 1000 + i
+        reply = api.expect_reply(chat_id)
+        started = time.perf_counter()
+        await api.inject_update(chat_id, "/ping")
+        await asyncio.wait_for(reply, 10)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run_mode(mode, updates, api_latency, webhook_port):
+    api = await FakeBotAPI(latency=api_latency).start()
+    application = (
+        Application.builder()
+        .token(FAKE_TOKEN)
+        .base_url(f"{api.base_url}/bot")
+        .build()
+    )
+    application.add_handler(CommandHandler("ping", ping))
+    server = None
+
+    await application.initialize()
+    await application.start()
+    try:
+        if mode == "polling":
+            await application.updater.start_polling(poll_interval=0, timeout=10)
+        else:
+            server = WebhookServer(application, SECRET)
+            await server.start(host="127.0.0.1", port=webhook_port)
+            await application.bot.set_webhook(
+                url=f"http://127.0.0.1:{webhook_port}{server.path}", secret_token=SECRET
+            )
+        await measure(api, min(10, updates))  # warm-up
+        latencies = await measure(api, updates)
+    finally:
+        if application.updater.running:
+            await application.updater.stop()
+        if server is not None:
+            await server.drain()
+        await application.stop()
+        if server is not None:
+            await server.stop()
+        await application.shutdown()
+        await api.stop()
+    return summarize(latencies)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="fake Bot API latency, seconds")
+    parser.add_argument("--webhook-port", type=int, default=8481)
+    args = parser.parse_args()
+
+    results = {
+        "updates": args.updates,
+        "api_latency_s": args.api_latency,
+        "polling": await run_mode("polling", args.updates, args.api_latency, args.webhook_port),
+        "webhook": await run_mode("webhook", args.updates, args.api_latency, args.webhook_port),
+    }
+    print(dumps(results))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Local stand-in for the Gemini API: a plaintext gRPC GenerativeService answering
+GenerateContent and StreamGenerateContent. Point the bot at it with
+GEMINI_API_ENDPOINT=127.0.0.1:<port>.
+
+Batch tarot prompts get a well-formed JSON array for the numbered cards they
+list; everything else gets plain text. Latency (with jitter), a share of
+UNAVAILABLE errors and a share of RESOURCE_EXHAUSTED (HTTP 429) quota errors
+can be injected.
+"""
+import re
+import json
+import random
+import asyncio
+
+import grpc
+from google.ai import generativelanguage as glm
+
+SERVICE = "google.ai.generativelanguage.v1beta.GenerativeService"
+BATCH_ENTRY = re.compile(r"^(\d+)\. (.+)$", re.MULTILINE)
+SAMPLE_TEXT = (
+    "🌙 Карта напоминает, что суета проходит, а смысл остаётся. "
+    "Судьба улыбается тем, кто умеет ждать. Сегодня стоит прислушаться к тишине.\n"
+    "«Терпение — горькое растение, но плод его сладок.» — Жан-Жак Руссо"
+)
+
+
+def make_response(text):
+    return glm.GenerateContentResponse(
+        candidates=[
+            glm.Candidate(
+                content=glm.Content(parts=[glm.Part(text=text)], role="model"),
+                finish_reason=glm.Candidate.FinishReason.STOP,
+                index=0,
+            )
+        ]
+    )
+
+
+class FakeGemini:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, quota_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.calls = {"generate": 0, "stream": 0}
+        self.injected = {"quota": 0, "error": 0}
+        self._rng = random.Random(seed)
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = grpc.aio.server()
+        handler = grpc.method_handlers_generic_handler(SERVICE, {
+            "GenerateContent": grpc.unary_unary_rpc_method_handler(
+                self.generate_content,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize,
+            ),
+            "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+                self.stream_generate_content,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize,
+            ),
+        })
+        self._server.add_generic_rpc_handlers((handler,))
+        self.port = self._server.add_insecure_port(f"{host}:{port}")
+        self.address = f"{host}:{self.port}"
+        await self._server.start()
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            await self._server.stop(grace=None)
+
+    async def _simulate(self, context):
+        await asyncio.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+        roll = self._rng.random()
+        if roll < self.quota_rate:
+            self.injected["quota"] += 1
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Resource has been exhausted")
+        if roll < self.quota_rate + self.error_rate:
+            self.injected["error"] += 1
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "The service is currently unavailable")
+
+    @staticmethod
+    def answer(request):
+        prompt = "".join(part.text for content in request.contents for part in content.parts)
+        entries = BATCH_ENTRY.findall(prompt)
+        if entries and "JSON" in prompt:
+            return json.dumps(
+                [{"id": int(entry_id), "text": f"{name}: {SAMPLE_TEXT}"} for entry_id, name in entries],
+                ensure_ascii=False,
+            )
+        return SAMPLE_TEXT
+
+    async def generate_content(self, request, context):
+        self.calls["generate"] += 1
+        await self._simulate(context)
+        return make_response(self.answer(request))
+
+    async def stream_generate_content(self, request, context):
+        self.calls["stream"] += 1
+        await self._simulate(context)
+        text = self.answer(request)
+        chunk = max(1, len(text) // 4)
+        for start in range(0, len(text), chunk):
+            yield make_response(text[start:start + chunk])
+            await asyncio.sleep(self.latency / 8)
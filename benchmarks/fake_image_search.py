@@ -0,0 +1,102 @@
+"""
+Local stand-in for an image search engine, for exercising download-images.py
+without Google. Each query gets a deterministic set of synthetic candidates: a
+few distinct portrait images, a rescaled duplicate, a landscape image and a
+broken file, so every filtering step of the pipeline runs.
+
+    python -m benchmarks.fake_image_search --port 8482 --latency 0.2
+    python download-images.py --source-url http://127.0.0.1:8482 --output /tmp/deck
+"""
+import io
+import random
+import asyncio
+import hashlib
+import argparse
+
+from aiohttp import web
+from PIL import Image, ImageDraw
+
+
+def synthetic_image(seed, size):
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(40, size[0]), y0 + rng.randrange(40, size[1])
+        draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return img
+
+
+def encode(img, quality=85):
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+class FakeImageSearch:
+    def __init__(self, latency=0.0, distinct=3):
+        self.latency = latency
+        self.distinct = distinct
+        self.searches = 0
+        self.downloads = 0
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/search", self.handle_search)
+        self.app.router.add_get("/image/{seed}/{kind}", self.handle_image)
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{self.port}"
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def handle_search(self, request):
+        self.searches += 1
+        await asyncio.sleep(self.latency)
+        seed = hashlib.sha256(request.query["q"].encode("utf-8")).hexdigest()[:16]
+        limit = int(request.query.get("n", 8))
+        kinds = ["broken", "landscape", "duplicate"] + [f"portrait{i}" for i in range(self.distinct)]
+        urls = [f"{self.base_url}/image/{seed}/{kind}" for kind in kinds]
+        return web.json_response({"results": urls[:limit]})
+
+    async def handle_image(self, request):
+        self.downloads += 1
+        await asyncio.sleep(self.latency)
+        seed, kind = request.match_info["seed"], request.match_info["kind"]
+        if kind == "broken":
+            return web.Response(body=b"not an image", content_type="image/jpeg")
+        if kind == "landscape":
+            data = encode(synthetic_image(f"{seed}-landscape", (900, 500)))
+        elif kind == "duplicate":
+            # The first portrait again, rescaled and recompressed: same picture, different bytes
+            img = synthetic_image(f"{seed}-portrait0", (600, 1000)).resize((720, 1200))
+            data = encode(img, quality=70)
+        else:
+            data = encode(synthetic_image(f"{seed}-{kind}", (600 + 40 * int(kind[-1]), 1000)))
+        return web.Response(body=data, content_type="image/jpeg")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8482)
+    parser.add_argument("--latency", type=float, default=0.0, help="per-request latency, seconds")
+    args = parser.parse_args()
+    server = await FakeImageSearch(args.latency).start(port=args.port)
+    print(f"Fake image search on {server.base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,241 @@
+"""
+Local stand-in for the Telegram Bot API, good enough for python-telegram-bot to
+poll, receive webhooks and send messages against. Point the bot at it with
+TELEGRAM_API_BASE_URL=http://127.0.0.1:<port>.
+
+Failures can be injected into send methods: a share of calls answered with a
+429 flood limit or a 500, and chats that answer 403 as if they blocked the bot.
+"""
+import json
+import time
+import random
+import asyncio
+import itertools
+
+import aiohttp
+from aiohttp import web
+
+FAKE_TOKEN = "123456:FAKE-TOKEN"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Fake", "username": "fake_tarot_bot"}
+
+
+SEND_METHODS = {"sendMessage", "sendPhoto", "editMessageCaption", "editMessageText", "sendChatAction"}
+
+
+class FakeBotAPI:
+    def __init__(
+        self,
+        token=FAKE_TOKEN,
+        latency=0.0,
+        error_rate=0.0,
+        flood_rate=0.0,
+        retry_after=1,
+        blocked_chats=(),
+        seed=None,
+    ):
+        self.token = token
+        self.latency = latency
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.blocked_chats = set(blocked_chats)
+        self.injected = {"flood": 0, "error": 0, "blocked": 0}
+        self._rng = random.Random(seed)
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.calls = {}
+        self.sent = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._pending = []
+        self._new_updates = asyncio.Event()
+        self._reply_waiters = {}
+        self._runner = None
+        self._session = None
+
+        self.app = web.Application()
+        self.app.router.add_route("*", f"/bot{token}/{{method}}", self.handle_method)
+
+    # --- server lifecycle ---
+    async def start(self, host="127.0.0.1", port=0):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{self.port}"
+        self._session = aiohttp.ClientSession()
+        return self
+
+    async def stop(self):
+        if self._session is not None:
+            await self._session.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # --- driving the bot ---
+    def make_message(self, chat_id, text):
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Bench"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            command = text.split()[0]
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return message
+
+    async def inject_update(self, chat_id, text):
+        """Deliver a user message to the bot, by webhook if one is set, else via getUpdates."""
+        return await self._deliver(
+            {"update_id": next(self._update_ids), "message": self.make_message(chat_id, text)}
+        )
+
+    def make_callback_query(self, chat_id, data):
+        message = self.make_message(chat_id, "…")
+        message["from"] = BOT_USER
+        return {
+            "id": str(next(self._update_ids)),
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "message": message,
+            "chat_instance": str(chat_id),
+            "data": data,
+        }
+
+    def make_update(self, chat_id, text):
+        """Update dict for a command or, for `callback:<data>`, an inline button press."""
+        if text.startswith("callback:"):
+            payload = {"callback_query": self.make_callback_query(chat_id, text[len("callback:"):])}
+        else:
+            payload = {"message": self.make_message(chat_id, text)}
+        return {"update_id": next(self._update_ids), **payload}
+
+    async def inject_callback(self, chat_id, data):
+        """Deliver an inline keyboard button press on an earlier bot message."""
+        return await self._deliver(self.make_update(chat_id, f"callback:{data}"))
+
+    async def _deliver(self, update):
+        if self.webhook_url:
+            headers = {"X-Telegram-Bot-Api-Secret-Token": self.webhook_secret or ""}
+            async with self._session.post(self.webhook_url, json=update, headers=headers) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Webhook answered {response.status}")
+        else:
+            self._pending.append(update)
+            self._new_updates.set()
+        return update["update_id"]
+
+    def expect_reply(self, chat_id):
+        """Future resolved with the next message the bot sends to `chat_id`."""
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters.setdefault(int(chat_id), []).append(future)
+        return future
+
+    # --- Bot API methods ---
+    async def handle_method(self, request):
+        method = request.match_info["method"]
+        params = dict(await request.post()) if request.can_read_body else {}
+        if not params and request.query:
+            params = dict(request.query)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method in SEND_METHODS:
+            failure = self._injected_failure(params)
+            if failure is not None:
+                return failure
+
+        handler = getattr(self, f"api_{method}", None)
+        if handler is None:
+            return self.ok(True)
+        return await handler(params)
+
+    @staticmethod
+    def ok(result):
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def error(status, description, **parameters):
+        body = {"ok": False, "error_code": status, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return web.json_response(body, status=status)
+
+    def _injected_failure(self, params):
+        chat_id = params.get("chat_id")
+        if chat_id is not None and int(chat_id) in self.blocked_chats:
+            self.injected["blocked"] += 1
+            return self.error(403, "Forbidden: bot was blocked by the user")
+        roll = self._rng.random()
+        if roll < self.flood_rate:
+            self.injected["flood"] += 1
+            return self.error(
+                429, f"Too Many Requests: retry after {self.retry_after}", retry_after=self.retry_after
+            )
+        if roll < self.flood_rate + self.error_rate:
+            self.injected["error"] += 1
+            return self.error(500, "Internal Server Error")
+        return None
+
+    async def api_getMe(self, params):
+        return self.ok(BOT_USER)
+
+    async def api_setWebhook(self, params):
+        self.webhook_url = params.get("url") or None
+        self.webhook_secret = params.get("secret_token")
+        return self.ok(True)
+
+    async def api_deleteWebhook(self, params):
+        self.webhook_url = None
+        return self.ok(True)
+
+    async def api_getUpdates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        self._pending = [u for u in self._pending if u["update_id"] >= offset]
+        if not self._pending and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.ok(list(self._pending))
+
+    def _record_message(self, method, params, **extra):
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            **extra,
+        }
+        self.sent.append((time.monotonic(), method, chat_id))
+        for future in self._reply_waiters.pop(chat_id, []):
+            if not future.done():
+                future.set_result(message)
+        return self.ok(message)
+
+    async def api_sendMessage(self, params):
+        return self._record_message("sendMessage", params, text=params.get("text", ""))
+
+    async def api_sendPhoto(self, params):
+        file_id = f"fake-file-{next(self._message_ids)}"
+        photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 1280}]
+        return self._record_message(
+            "sendPhoto", params, photo=photo, caption=params.get("caption", "")
+        )
+
+    async def api_editMessageCaption(self, params):
+        return self._record_message("editMessageCaption", params, caption=params.get("caption", ""))
+
+    async def api_editMessageText(self, params):
+        return self._record_message("editMessageText", params, text=params.get("text", ""))
+
+
+def dumps(data):
+    return json.dumps(data, indent=2, ensure_ascii=False)
@@ -0,0 +1,69 @@
+"""
+Seeded Postgres fixture for benchmarks: N users spread over M timezones with a
+skewed (Zipf-like) distribution, as real audiences are, plus a share of chats
+marked as blocked for the fake Bot API. The same seed always gives the same data.
+
+DESTRUCTIVE: truncates every bot table. Only point it at a throwaway database.
+"""
+import random
+
+import migrations
+import repository
+
+TIMEZONES = (
+    "Europe/London", "Europe/Moscow", "Europe/Berlin", "America/New_York",
+    "Asia/Kolkata", "Asia/Tokyo", "Australia/Sydney", "America/Los_Angeles",
+    "Asia/Almaty", "Europe/Kiev", "America/Sao_Paulo", "Africa/Cairo",
+)
+FIRST_USER_ID = 100_000
+
+TRUNCATE_TABLES = """
+    TRUNCATE users, delivery_outbox, card_interpretations, ai_cache, card_images
+"""
+
+INSERT_USERS = """
+    INSERT INTO users (user_id, username, first_name, last_name, name, gender,
+                       start_date, last_visited, subscribed, timezone)
+    SELECT u.user_id, 'bench' || u.user_id, 'Bench', NULL, u.name, u.gender,
+           now(), now(), u.subscribed, u.timezone
+    FROM unnest($1::bigint[], $2::text[], $3::text[], $4::boolean[], $5::text[])
+        AS u(user_id, name, gender, subscribed, timezone)
+"""
+
+
+def generate_users(users, timezones, seed, subscribed_rate=0.9, blocked_rate=0.0):
+    """Rows of (user_id, name, gender, subscribed, timezone) and the set of blocked ids."""
+    rng = random.Random(seed)
+    zones = list(TIMEZONES[:timezones])
+    weights = [1 / (rank + 1) for rank in range(len(zones))]
+    rows, blocked = [], set()
+    for index in range(users):
+        user_id = FIRST_USER_ID + index
+        named = rng.random() < 0.5
+        rows.append((
+            user_id,
+            f"User{index}" if named else None,
+            rng.choice(("Мужчина", "Женщина")) if named else None,
+            rng.random() < subscribed_rate,
+            # NULL timezone exercises the COALESCE default
+            None if zones[0] == "Europe/London" and rng.random() < 0.1
+            else rng.choices(zones, weights)[0],
+        ))
+        if rng.random() < blocked_rate:
+            blocked.add(user_id)
+    return rows, blocked
+
+
+async def seed_database(users, timezones, seed, subscribed_rate=0.9, blocked_rate=0.0):
+    """Migrate, wipe and fill the database behind `repository`'s pool.
+    Returns (rows, blocked user ids)."""
+    await migrations.migrate()
+    rows, blocked = generate_users(users, timezones, seed, subscribed_rate, blocked_rate)
+    async with repository.get_pool().acquire() as connection:
+        async with connection.transaction():
+            await connection.execute(TRUNCATE_TABLES)
+            for start in range(0, len(rows), 10_000):
+                chunk = rows[start:start + 10_000]
+                await connection.execute(INSERT_USERS, *(list(column) for column in zip(*chunk)))
+        await connection.execute("ANALYZE users")
+    return rows, blocked
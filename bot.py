@@ -1,18 +1,42 @@
 import os
-import logging
-import random
+import signal
 import asyncio
+import logging
+from collections import Counter
 from dotenv import load_dotenv
-from datetime import time, datetime
+from datetime import time, timedelta
 from types import SimpleNamespace
 
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import Application, CallbackContext, CommandHandler
 import google.generativeai as genai
-import psycopg2
 import pytz
 
-from tarot_cards import tarot_cards
-from ai_prompt import generate_tarot_prompt
+import ai_cache
+import ai_client
+import image_store
+import migrations
+import outbox
+import profile_cache
+import repository
+from ai_client import TAROT_MODEL, generate_text, stream_text
+from ai_scheduler import BROADCAST, INTERACTIVE
+from broadcast import telegram_rate_limiter
+from pregen import (
+    PREGEN_LEAD_MINUTES,
+    draw_interpretation,
+    fallback_interpretation,
+    get_interpretation_pool,
+    pregenerate_interpretations,
+)
+from deck import deck
+from ai_prompt import TAROT_PROMPT_VERSION, generate_tarot_prompt
+from card_images import send_card_photo
+from horoscope import register_horoscope_handlers
+from leader import LeaderLock
+from scheduler import DELIVER, DeliveryScheduler, describe_plan
+from start import start
 
 
 # Load environment variables
@@ -20,6 +44,7 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 DATABASE_URL = os.getenv("DATABASE_URL2")
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")
 
 if not TELEGRAM_BOT_TOKEN:
     raise EnvironmentError("TELEGRAM_BOT_TOKEN missing")
@@ -36,115 +61,178 @@ logging.basicConfig(
 )
 logger = logging.getLogger("TarotBot")
 
-
-def get_utc_hour_for_timezone(tz_name, local_hour=10):
-    """
-    Calculate UTC hour for a given timezone's local hour.
-    """
-    try:
-        tz = pytz.timezone(tz_name)
-        # Create a naive datetime for today at the target local hour
-        now = datetime.now()
-        local_time = tz.localize(
-            datetime(now.year, now.month, now.day, local_hour, 0, 0)
-        )
-        # Convert to UTC
-        utc_time = local_time.astimezone(pytz.UTC)
-        return utc_time.hour
-    except Exception as e:
-        logger.warning(
-            f"Error calculating UTC hour for {tz_name}, defaulting to {local_hour}: {e}"
-        )
-        return local_hour
+SCHEDULER_TICK_SECONDS = int(os.getenv("SCHEDULER_TICK_SECONDS", "30"))
+LEADER_REFRESH_SECONDS = int(os.getenv("LEADER_REFRESH_SECONDS", "15"))
+TIMEZONE_SYNC_SECONDS = int(os.getenv("TIMEZONE_SYNC_SECONDS", "300"))
+# Deliveries spread over this many minutes from 10:00 local, each user at a fixed minute
+DELIVERY_WINDOW_MINUTES = int(os.getenv("DELIVERY_WINDOW_MINUTES", "30"))
+# How late a missed slot still fires, e.g. after a restart just past 10:00
+DELIVERY_GRACE_MINUTES = int(os.getenv("DELIVERY_GRACE_MINUTES", "60"))
+AI_STATS_LOG_SECONDS = int(os.getenv("AI_STATS_LOG_SECONDS", "900"))
+TAROT_STREAMING = os.getenv("TAROT_STREAMING", "1") == "1"
+# Telegram tolerates roughly one edit per second per chat
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.2"))
+CAPTION_LIMIT = 1024
+
+# Daily readings at 10:00 local time in every subscriber timezone
+delivery_scheduler = DeliveryScheduler(
+    local_time=time(hour=10),
+    pregen_lead=timedelta(minutes=PREGEN_LEAD_MINUTES),
+    window=timedelta(minutes=DELIVERY_WINDOW_MINUTES),
+    grace=timedelta(minutes=DELIVERY_GRACE_MINUTES),
+)
+# Only the process holding this lock schedules deliveries
+leader_lock = LeaderLock()
 
 
 # --- DB Helpers ---
-def subscribe_user(user):
-    """Mark subscribed & update last seen + username info."""
-    query = """
-        INSERT INTO users (user_id, username, first_name, last_name, start_date, last_visited, subscribed)
-        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, TRUE)
-        ON CONFLICT (user_id)
-        DO UPDATE SET
-            username = EXCLUDED.username,
-            first_name = EXCLUDED.first_name,
-            last_name = EXCLUDED.last_name,
-            last_visited = CURRENT_TIMESTAMP,
-            subscribed = TRUE;
+async def subscribe_user(user):
+    """
+    Mark subscribed & update last seen + username info. Returns the user's timezone.
     """
     try:
-        with psycopg2.connect(DATABASE_URL) as con:
-            with con.cursor() as cur:
-                cur.execute(
-                    query, (user.id, user.username, user.first_name, user.last_name)
-                )
+        tz_name = await repository.subscribe_user(
+            user.id, user.username, user.first_name, user.last_name
+        )
         logger.info(f"User {user.id} subscribed ✅")
+        return tz_name
     except Exception as e:
         logger.error(f"DB subscribe error: {e}")
+        return None
 
 
-def unsubscribe_user(user_id):
+async def unsubscribe_user(user_id):
     """Set subscribed = FALSE."""
     try:
-        with psycopg2.connect(DATABASE_URL) as con:
-            with con.cursor() as cur:
-                cur.execute(
-                    "UPDATE users SET subscribed=FALSE WHERE user_id=%s", (user_id,)
-                )
+        await repository.unsubscribe_user(user_id)
         logger.info(f"User {user_id} unsubscribed ❌")
     except Exception as e:
         logger.error(f"DB unsubscribe error: {e}")
 
 
-def get_subscribers_by_timezone():
-    """Return dict: timezone -> [user_ids]"""
+# --- Tarot Logic ---
+def tarot_cache_key(card, name=None, gender=None):
+    return ai_cache.make_key(
+        "tarot", TAROT_PROMPT_VERSION, TAROT_MODEL,
+        card=card.name, name=name, gender=gender,
+    )
+
+
+async def generate_tarot_text(card, name=None, gender=None, priority=INTERACTIVE):
+    """
+    AI interpretation for a card. If Gemini times out, fails or its circuit is
+    open, a stored interpretation of the same card is served instead.
+    """
+    prompt = generate_tarot_prompt(card.name, name, gender)
+    key = tarot_cache_key(card, name, gender)
     try:
-        with psycopg2.connect(DATABASE_URL) as con:
-            with con.cursor() as cur:
-                cur.execute("""
-                    SELECT COALESCE(timezone, 'Europe/London'), array_agg(user_id)
-                    FROM users WHERE subscribed = TRUE
-                    GROUP BY COALESCE(timezone, 'Europe/London')
-                """)
-                rows = cur.fetchall()
-                return {row[0]: row[1] for row in rows}
+        return await ai_cache.get_or_generate(
+            key, lambda: generate_text(prompt, priority=priority)
+        )
     except Exception as e:
-        logger.error(f"DB fetch timezone error: {e}")
-        return {}
+        fallback = await fallback_interpretation(card.name)
+        if fallback is None:
+            raise
+        logger.warning(f"AI unavailable ({type(e).__name__}: {e}), serving stored text for {card.name}")
+        return fallback
 
 
-# --- Tarot Logic ---
-async def generate_tarot_text(card, name=None, gender=None):
-    prompt = generate_tarot_prompt(card["name"], name, gender)
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = await model.generate_content_async(prompt)
-    return response.text.strip()
+def build_caption(card, poetic):
+    header = f"{card.name}\n{card.category.capitalize()} — {card.meaning}\n\n"
+    body = f"«{poetic}»"
+    if len(header) + len(body) > CAPTION_LIMIT:
+        body = body[: CAPTION_LIMIT - len(header) - 2] + "…»"
+    return header + body
 
 
-async def send_tarot_to_chat(chat_id, context):
-    random.shuffle(tarot_cards)
-    card = random.choice(tarot_cards)
+async def edit_caption(bot, message, caption):
+    try:
+        await bot.edit_message_caption(
+            chat_id=message.chat_id, message_id=message.message_id, caption=caption
+        )
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
 
+
+async def stream_tarot_to_chat(chat_id, context, card):
+    """
+    Send the card photo with its classical meaning right away, then fill in the AI
+    interpretation by editing the caption as Gemini streams it (throttled edits).
+    """
+    key = tarot_cache_key(card)
+    cached = await ai_cache.get(key)
+    if cached is not None:
+        await send_card_photo(context.bot, chat_id, card.image_path, build_caption(card, cached))
+        return
+
+    message = await send_card_photo(context.bot, chat_id, card.image_path, build_caption(card, "🔮 …"))
+    text, last_edit = "", asyncio.get_running_loop().time()
     try:
-        poetic = await generate_tarot_text(card)
-        caption = (
-            f"{card['name']}\n"
-            f"{card['category'].capitalize()} — {card['meaning']}\n\n"
-            f"«{poetic}»"
+        async for chunk in stream_text(generate_tarot_prompt(card.name)):
+            text += chunk
+            now = asyncio.get_running_loop().time()
+            if now - last_edit >= STREAM_EDIT_INTERVAL:
+                last_edit = now
+                try:
+                    await edit_caption(context.bot, message, build_caption(card, text.strip() + " …"))
+                except Exception as e:
+                    # A skipped progress edit is harmless, the final edit carries the full text
+                    logger.warning(f"Progress edit failed for {chat_id}: {e}")
+    except Exception as e:
+        logger.error(f"AI generation error: {e}")
+        fallback = await fallback_interpretation(card.name)
+        await edit_caption(
+            context.bot, message,
+            build_caption(card, fallback or "AI error — try again later 😔"),
         )
+        return
+
+    text = text.strip()
+    await edit_caption(context.bot, message, build_caption(card, text))
+    await ai_cache.put(key, text)
 
-        with open(card["image_path"], "rb") as img:
-            await context.bot.send_photo(chat_id=chat_id, photo=img, caption=caption)
+
+async def send_tarot_to_chat(chat_id, context):
+    card = deck.draw()
+
+    try:
+        if TAROT_STREAMING:
+            await stream_tarot_to_chat(chat_id, context, card)
+            return True
+        poetic = await generate_tarot_text(card)
+        await send_card_photo(context.bot, chat_id, card.image_path, build_caption(card, poetic))
+        return True
 
     except FileNotFoundError:
         await context.bot.send_message(
-            chat_id=chat_id, text=f"No image found for {card['name']}."
+            chat_id=chat_id, text=f"No image found for {card.name}."
         )
+    except RetryAfter as e:
+        # The rate limiter already retried; Telegram wants a longer pause than we wait
+        logger.warning(f"Flood limit for {chat_id}, giving up after retries: {e}")
     except Exception as e:
         logger.error(f"AI generation error: {e}")
         await context.bot.send_message(
             chat_id=chat_id, text="AI error — try again later 😔"
         )
+    return False
+
+
+async def deliver_daily_tarot(bot, user_id, day):
+    """
+    Send a user's card of the day. The text comes from the pre-generated pool,
+    falling back to a live Gemini call. Raises on failure so the outbox retries.
+    """
+    card = deck.draw_for_user(user_id, day)
+    poetic = draw_interpretation(await get_interpretation_pool(day), card.name)
+    if poetic is None:
+        logger.warning(f"No pre-generated interpretation for {card.name}")
+        # Cheap reachability check before paying for a live generation: a blocked
+        # chat fails here with Forbidden and the outbox unsubscribes it
+        await bot.send_chat_action(chat_id=user_id, action=ChatAction.UPLOAD_PHOTO)
+        poetic = await generate_tarot_text(card, priority=BROADCAST)
+    await send_card_photo(bot, user_id, card.image_path, build_caption(card, poetic))
 
 
 async def tarot(update, context):
@@ -153,57 +241,176 @@ async def tarot(update, context):
 
 # --- Commands ---
 async def subscribe(update, context):
-    subscribe_user(update.effective_user)
+    tz_name = await subscribe_user(update.effective_user)
+    if tz_name:
+        delivery_scheduler.add_timezone(tz_name)
     await update.message.reply_text("✅ Subscribed to daily tarot readings!")
 
 
 async def unsubscribe(update, context):
-    unsubscribe_user(update.effective_chat.id)
+    await unsubscribe_user(update.effective_chat.id)
     await update.message.reply_text("❌ Unsubscribed from daily tarot readings.")
 
 
-# --- Daily Background Job ---
+# --- Daily Background Jobs ---
+async def pregen_tarot_job(context: CallbackContext):
+    """Fill the interpretation pool before the timezone's delivery slot."""
+    await pregenerate_interpretations(context.job.data["day"])
+
+
 async def daily_tarot_job(context: CallbackContext):
+    """Queue the day's deliveries for a timezone, each due at the user's minute in the
+    delivery window; the outbox worker sends them as they come due."""
     timezone = context.job.data["timezone"]
-    tz_list = get_subscribers_by_timezone()
-    user_ids = tz_list.get(timezone, [])
-
-    logger.info(f"Sending tarot to {len(user_ids)} users in {timezone}")
+    day = context.job.data["day"]
+    due = context.job.data["due"]
+    buckets = Counter()
+    try:
+        queued = await repository.enqueue_deliveries(
+            timezone, day, lambda user_ids: delivery_scheduler.plan_sends(due, user_ids, buckets)
+        )
+    except Exception as e:
+        logger.error(f"DB enqueue error for {timezone}: {e}")
+        return
 
-    for user_id in user_ids:
-        try:
-            await send_tarot_to_chat(user_id, context)
-            await asyncio.sleep(10)  # prevent AI API rate limit
-        except Exception as e:
-            logger.error(f"Failed send → {user_id}: {e}")
+    if not queued and timezone not in await repository.get_subscriber_timezones():
+        logger.info(f"No subscribers left in {timezone}, unscheduling it")
+        delivery_scheduler.remove_timezone(timezone)
+        return
 
+    logger.info(f"Queued tarot for {queued} users in {timezone} ({day}): {describe_plan(buckets)}")
 
-def main():
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
 
-    # Register commands
-    application.add_handler(CommandHandler("subscribe", subscribe))
-    application.add_handler(CommandHandler("unsubscribe", unsubscribe))
-    application.add_handler(CommandHandler("tarot", tarot))
+async def sync_timezones(context: CallbackContext = None):
+    """Pick up timezones whose first subscriber arrived through another process."""
+    try:
+        timezones = await repository.get_subscriber_timezones()
+    except Exception as e:
+        logger.error(f"DB fetch timezone error: {e}")
+        return
+    for tz_name in timezones:
+        delivery_scheduler.add_timezone(tz_name)
 
-    # Schedule per timezone at their local 10:00 AM (converted to UTC)
-    tz_users = get_subscribers_by_timezone()
 
-    for tz_name in tz_users:
-        utc_hour = get_utc_hour_for_timezone(tz_name, local_hour=10)
+async def delivery_tick(context: CallbackContext):
+    """
+    Start the pre-generation and delivery jobs whose instant has come. Only the
+    leader advances its heap: a follower that becomes leader then still runs what
+    fell due during the handover, within the scheduler's grace period.
+    """
+    if not leader_lock.is_leader:
+        return
+    events = delivery_scheduler.pop_due()
+    for event in events:
+        callback = daily_tarot_job if event.kind == DELIVER else pregen_tarot_job
+        context.job_queue.run_once(
+            callback,
+            when=0,
+            data={"timezone": event.timezone, "day": event.day, "due": event.due},
+            name=f"{event.kind}_tarot_{event.timezone}_{event.day}",
+        )
 
-        logger.info(f"Scheduling {tz_name} at {utc_hour}:00 UTC (10:00 local)")
 
-        # Schedule daily job at the calculated UTC hour
-        application.job_queue.run_daily(
-            daily_tarot_job,
-            time=time(hour=utc_hour, minute=0, tzinfo=pytz.UTC),
-            data={"timezone": tz_name},
-            name=f"daily_tarot_{tz_name}",
+async def log_ai_stats(context: CallbackContext):
+    logger.info(
+        f"AI stats: {ai_client.stats()} cache: {ai_cache.stats()} outbox: {outbox.stats()} "
+        f"telegram: {telegram_rate_limiter.stats()}"
+    )
+
+
+async def post_init(application: Application):
+    if ai_client.GEMINI_API_ENDPOINT:
+        ai_client.use_endpoint()
+    await migrations.migrate()
+    await repository.init_pool()
+    await image_store.preload(card.image_path for card in deck)
+    application.job_queue.run_daily(
+        ai_cache.purge_expired, time=time(hour=3, tzinfo=pytz.UTC), name="ai_cache_purge"
+    )
+    application.job_queue.run_repeating(
+        log_ai_stats, interval=AI_STATS_LOG_SECONDS, name="ai_stats"
+    )
+    application.job_queue.run_repeating(
+        profile_cache.flush, interval=profile_cache.PROFILE_FLUSH_SECONDS, name="profile_flush"
+    )
+
+    await leader_lock.refresh()
+    await sync_timezones()
+    application.job_queue.run_repeating(
+        leader_lock.refresh, interval=LEADER_REFRESH_SECONDS, name="leader_refresh"
+    )
+    application.job_queue.run_repeating(
+        sync_timezones, interval=TIMEZONE_SYNC_SECONDS, name="timezone_sync"
+    )
+    application.job_queue.run_repeating(
+        delivery_tick, interval=SCHEDULER_TICK_SECONDS, first=0, name="delivery_tick"
+    )
+    outbox.start_worker(
+        lambda user_id, day: deliver_daily_tarot(application.bot, user_id, day)
+    )
+
+
+async def post_shutdown(application: Application):
+    await outbox.stop_worker()
+    await profile_cache.flush()
+    await leader_lock.release()
+    await repository.close_pool()
+
+
+def build_application(handlers=True):
+    """Application with (unless `handlers=False`) every command registered. Entry points
+    run post_init/post_shutdown themselves, around Application.start/stop."""
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .rate_limiter(telegram_rate_limiter)
+    )
+    if TELEGRAM_API_BASE_URL:
+        # e.g. a local fake Bot API for tests and benchmarks
+        builder = builder.base_url(f"{TELEGRAM_API_BASE_URL}/bot").base_file_url(
+            f"{TELEGRAM_API_BASE_URL}/file/bot"
         )
+    application = builder.build()
+
+    if handlers:
+        # Register commands
+        application.add_handler(CommandHandler("start", start))
+        application.add_handler(CommandHandler("subscribe", subscribe))
+        application.add_handler(CommandHandler("unsubscribe", unsubscribe))
+        application.add_handler(CommandHandler("tarot", tarot))
+        register_horoscope_handlers(application)
+    return application
 
+
+async def run_polling():
+    """
+    Long-polling mode. Drives the lifecycle itself like worker.py and webhook.py:
+    PTB's run_polling calls post_shutdown only after Application.shutdown, when
+    the outbox worker would still be sending through a closed bot client.
+    """
+    application = build_application()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    await post_init(application)
+    await application.updater.start_polling()
+    await application.start()
     logger.info("Bot started ✅✨")
-    application.run_polling()
+    try:
+        await stop.wait()
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await post_shutdown(application)
+        await application.shutdown()
+        logger.info("Bot stopped")
+
+
+def main():
+    asyncio.run(run_polling())
 
 
 if __name__ == "__main__":
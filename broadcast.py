@@ -0,0 +1,29 @@
+"""
+Telegram send-rate settings for broadcasts, and the process-wide adaptive rate
+limiter every Bot API call goes through.
+"""
+import os
+import logging
+
+from dotenv import load_dotenv
+
+from rate_limit import AdaptiveRateLimiter
+
+load_dotenv()
+# Concurrent outbox send slots per process
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+TELEGRAM_MESSAGES_PER_SECOND = float(os.getenv("TELEGRAM_MESSAGES_PER_SECOND", "25"))
+# Ceiling the adaptive limiter may probe up to; Telegram documents about 30 msg/s
+TELEGRAM_MAX_MESSAGES_PER_SECOND = float(os.getenv("TELEGRAM_MAX_MESSAGES_PER_SECOND", "30"))
+TELEGRAM_MESSAGES_PER_CHAT_PER_SECOND = float(
+    os.getenv("TELEGRAM_MESSAGES_PER_CHAT_PER_SECOND", "1")
+)
+
+logger = logging.getLogger(__name__)
+
+# Installed as the Application's rate limiter, so it paces every Bot API call
+telegram_rate_limiter = AdaptiveRateLimiter(
+    rate=TELEGRAM_MESSAGES_PER_SECOND,
+    max_rate=TELEGRAM_MAX_MESSAGES_PER_SECOND,
+    per_chat_rate=TELEGRAM_MESSAGES_PER_CHAT_PER_SECOND,
+)
@@ -0,0 +1,132 @@
+"""
+Build Telegram-sized card images from the originals in `images/`.
+
+Each card becomes a progressive JPEG no larger than --max-dimension on its long
+side and, where quality allows, under --byte-budget bytes. `assets/manifest.json`
+maps every original image path to its derivative and the sha256 of both files,
+so unchanged cards are skipped on the next run and the bot can verify what it
+loads. Needs Pillow, which the bot itself does not.
+
+    python build_assets.py [--force]
+"""
+import os
+import io
+import json
+import hashlib
+import argparse
+import logging
+
+from PIL import Image
+
+from tarot_cards import tarot_cards
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Telegram shows photos at most 1280px on the long side and recompresses anything larger
+MAX_DIMENSION = 1280
+BYTE_BUDGET = 250_000
+QUALITY_STEPS = (88, 82, 76, 70, 64, 58)
+
+logger = logging.getLogger("build_assets")
+
+
+def sha256_of(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def load_manifest(assets_dir=ASSETS_DIR):
+    try:
+        with open(os.path.join(assets_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def encode(source, max_dimension, byte_budget):
+    """Downscale and re-encode one image; returns (jpeg bytes, width, height, quality)."""
+    with Image.open(io.BytesIO(source)) as img:
+        img = img.convert("RGB")
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        for quality in QUALITY_STEPS:
+            out = io.BytesIO()
+            img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+            if out.tell() <= byte_budget:
+                break
+        return out.getvalue(), img.width, img.height, quality
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build(assets_dir=ASSETS_DIR, max_dimension=MAX_DIMENSION, byte_budget=BYTE_BUDGET, force=False):
+    os.makedirs(assets_dir, exist_ok=True)
+    previous = load_manifest(assets_dir)
+    settings = {"max_dimension": max_dimension, "byte_budget": byte_budget}
+    if previous is None or previous.get("settings") != settings:
+        force = True
+    previous_cards = previous["cards"] if previous else {}
+
+    cards, built, source_bytes, asset_bytes = {}, 0, 0, 0
+    for raw in tarot_cards:
+        image_path = raw["image_path"]
+        try:
+            with open(os.path.join(BASE_DIR, image_path), "rb") as f:
+                source = f.read()
+        except FileNotFoundError:
+            logger.warning(f"No original for {image_path}, skipping")
+            continue
+        source_sha256 = sha256_of(source)
+        entry = previous_cards.get(image_path)
+        if (
+            not force
+            and entry
+            and entry["source_sha256"] == source_sha256
+            and os.path.isfile(os.path.join(assets_dir, entry["file"]))
+        ):
+            cards[image_path] = entry
+        else:
+            data, width, height, quality = encode(source, max_dimension, byte_budget)
+            file_name = os.path.splitext(os.path.basename(image_path))[0] + ".jpg"
+            write_atomic(os.path.join(assets_dir, file_name), data)
+            cards[image_path] = {
+                "file": file_name,
+                "sha256": sha256_of(data),
+                "source_sha256": source_sha256,
+                "width": width,
+                "height": height,
+                "quality": quality,
+                "bytes": len(data),
+            }
+            built += 1
+            if len(data) > byte_budget:
+                logger.warning(f"{image_path} is {len(data)} bytes even at quality {quality}")
+        source_bytes += len(source)
+        asset_bytes += cards[image_path]["bytes"]
+
+    manifest = {"version": MANIFEST_VERSION, "settings": settings, "cards": cards}
+    write_atomic(
+        os.path.join(assets_dir, MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    logger.info(
+        f"{len(cards)} card assets ({built} rebuilt): "
+        f"{source_bytes / 1e6:.1f} MB originals -> {asset_bytes / 1e6:.1f} MB"
+    )
+    return manifest
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-dimension", type=int, default=MAX_DIMENSION)
+    parser.add_argument("--byte-budget", type=int, default=BYTE_BUDGET)
+    parser.add_argument("--force", action="store_true", help="rebuild every card")
+    args = parser.parse_args()
+    build(max_dimension=args.max_dimension, byte_budget=args.byte_budget, force=args.force)
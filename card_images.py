@@ -0,0 +1,67 @@
+import os
+import logging
+
+from telegram import InputFile
+from telegram.error import BadRequest
+
+import image_store
+from db import delete_card_file_id, get_card_file_id, save_card_file_id
+
+logger = logging.getLogger(__name__)
+
+# (image_path, content_hash) -> Telegram file_id
+_file_ids = {}
+
+# BadRequest texts that mean the file_id itself is unusable, not the chat or caption
+STALE_FILE_ID_MESSAGES = (
+    "wrong file identifier", "wrong remote file", "wrong file_id", "file reference", "file_reference",
+)
+
+
+async def _lookup_file_id(key):
+    file_id = _file_ids.get(key)
+    if file_id is None:
+        file_id = await get_card_file_id(*key)
+        if file_id:
+            _file_ids[key] = file_id
+    return file_id
+
+
+def is_stale_file_id(error):
+    text = str(error).lower()
+    return any(message in text for message in STALE_FILE_ID_MESSAGES)
+
+
+async def _forget_file_id(key):
+    _file_ids.pop(key, None)
+    await delete_card_file_id(*key)
+
+
+async def send_card_photo(bot, chat_id, image_path, caption):
+    """
+    Send a card image, reusing the Telegram file_id from an earlier upload.
+    Falls back to uploading the preloaded bytes when there is no cached id or Telegram
+    rejects the id itself; any other BadRequest (dead chat, bad caption) is re-raised
+    so the shared id survives. The id is keyed by content hash, so a rebuilt asset is
+    uploaded afresh.
+    """
+    image = image_store.get(image_path)
+    key = (image_path, image.content_hash)
+
+    file_id = await _lookup_file_id(key)
+    if file_id:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+        except BadRequest as e:
+            if not is_stale_file_id(e):
+                raise
+            logger.warning(f"Cached file_id rejected for {image_path}, re-uploading: {e}")
+            await _forget_file_id(key)
+
+    photo = InputFile(image.data, filename=os.path.basename(image_path))
+    message = await bot.send_photo(chat_id=chat_id, photo=photo, caption=caption)
+
+    file_id = message.photo[-1].file_id
+    _file_ids[key] = file_id
+    await save_card_file_id(*key, file_id)
+    return message
@@ -1,39 +1,48 @@
-import os
-import psycopg2
 import logging
-from dotenv import load_dotenv
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL2")
+import profile_cache
+import repository
+
 logger = logging.getLogger(__name__)
 
-def add_user_to_db(user_id, username, first_name, last_name, name=None, gender=None):
+async def add_user_to_db(user_id, username, first_name, last_name, name=None, gender=None):
+    """
+    Record a visit. Plain visits are buffered and written in the next batched
+    flush; setting name/gender is written through immediately.
+    """
+    if name is None and gender is None:
+        profile_cache.touch(user_id, username, first_name, last_name)
+        return
     try:
-        with psycopg2.connect(DATABASE_URL) as connection:
-            with connection.cursor() as cursor:
-                query = """
-                    INSERT INTO users (user_id, username, first_name, last_name, name, gender, start_date, last_visited)
-                    VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                    ON CONFLICT (user_id)
-                    DO UPDATE SET 
-                        username = EXCLUDED.username, 
-                        first_name = EXCLUDED.first_name,
-                        last_name = EXCLUDED.last_name,
-                        name = COALESCE(EXCLUDED.name, users.name),
-                        gender = COALESCE(EXCLUDED.gender, users.gender),
-                        last_visited = CURRENT_TIMESTAMP;
-                """
-                cursor.execute(query, (user_id, username, first_name, last_name, name, gender))
-                logger.info(f"User {username} added/updated in the database.")
+        await repository.upsert_user(user_id, username, first_name, last_name, name, gender)
+        logger.info(f"User {username} added/updated in the database.")
     except Exception as e:
         logger.error(f"Database error: {e}")
 
-def get_user_from_db(user_id):
+async def get_user_from_db(user_id):
+    """Return (name, gender) for a user, or None if unknown."""
     try:
-        with psycopg2.connect(DATABASE_URL) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT name, gender FROM users WHERE user_id = %s", (user_id,))
-                return cursor.fetchone()
+        row = await repository.get_user_profile(user_id)
+        return (row["name"], row["gender"]) if row else None
     except Exception as e:
         logger.error(f"Database error: {e}")
         return None
+
+async def get_card_file_id(image_path, content_hash):
+    try:
+        return await repository.get_card_file_id(image_path, content_hash)
+    except Exception as e:
+        logger.error(f"Database error: {e}")
+        return None
+
+async def save_card_file_id(image_path, content_hash, file_id):
+    try:
+        await repository.save_card_file_id(image_path, content_hash, file_id)
+    except Exception as e:
+        logger.error(f"Database error: {e}")
+
+async def delete_card_file_id(image_path, content_hash):
+    try:
+        await repository.delete_card_file_id(image_path, content_hash)
+    except Exception as e:
+        logger.error(f"Database error: {e}")
@@ -0,0 +1,102 @@
+"""
+Immutable tarot deck built from `tarot_cards.py` and validated against `images/`
+at import time. Drawing never mutates shared state.
+"""
+import os
+import random
+import hashlib
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from tarot_cards import tarot_cards
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REQUIRED_FIELDS = ("name", "category", "meaning", "image_path")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Card:
+    id: str
+    name: str
+    category: str
+    meaning: str
+    image_path: str
+
+    @property
+    def suit(self):
+        return self.category
+
+
+class Deck:
+    def __init__(self, cards):
+        self.cards = tuple(cards)
+        if not self.cards:
+            raise ValueError("Deck has no valid cards")
+        self._by_id = MappingProxyType({card.id: card for card in self.cards})
+        self._by_name = MappingProxyType({card.name: card for card in self.cards})
+        suits = {}
+        for card in self.cards:
+            suits.setdefault(card.suit, []).append(card)
+        self._by_suit = MappingProxyType({suit: tuple(cards) for suit, cards in suits.items()})
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def by_id(self, card_id):
+        return self._by_id.get(card_id)
+
+    def by_name(self, name):
+        return self._by_name.get(name)
+
+    def by_suit(self, suit):
+        return self._by_suit.get(suit, ())
+
+    @property
+    def suits(self):
+        return tuple(self._by_suit)
+
+    def draw(self, rng=random):
+        """Draw one card uniformly at random in O(1)."""
+        return self.cards[rng.randrange(len(self.cards))]
+
+    def draw_seeded(self, *seed):
+        """Deterministic draw: the same seed parts always give the same card."""
+        digest = hashlib.sha256("|".join(map(str, seed)).encode("utf-8")).digest()
+        return self.cards[int.from_bytes(digest[:8], "big") % len(self.cards)]
+
+    def draw_for_user(self, user_id, day):
+        """The card of the day for a user, stable across retries and restarts."""
+        return self.draw_seeded("daily", user_id, day.isoformat())
+
+
+def build_deck(raw_cards=tarot_cards, base_dir=BASE_DIR):
+    """Validate raw card dicts and build a Deck; invalid entries are logged and skipped."""
+    cards, seen_ids, seen_names = [], set(), set()
+    for index, raw in enumerate(raw_cards):
+        missing = [field for field in REQUIRED_FIELDS if not raw.get(field)]
+        if missing:
+            logger.error(f"Card #{index} {raw.get('name')!r} is missing {', '.join(missing)}")
+            continue
+        if not os.path.isfile(os.path.join(base_dir, raw["image_path"])):
+            logger.error(f"Card {raw['name']!r} has no image at {raw['image_path']}")
+            continue
+        card_id = os.path.splitext(os.path.basename(raw["image_path"]))[0]
+        if card_id in seen_ids or raw["name"] in seen_names:
+            logger.error(f"Duplicate card {raw['name']!r} ({card_id})")
+            continue
+        seen_ids.add(card_id)
+        seen_names.add(raw["name"])
+        cards.append(Card(card_id, raw["name"], raw["category"], raw["meaning"], raw["image_path"]))
+
+    deck = Deck(cards)
+    logger.info(f"Deck loaded: {len(deck)}/{len(raw_cards)} cards valid")
+    return deck
+
+
+deck = build_deck()
@@ -1,65 +1,313 @@
+"""
+Fetch one image per tarot card into `images/`.
+
+Cards are processed concurrently by a worker pool. For each card the search
+source returns candidate URLs; candidates are downloaded, decoded, filtered to
+portrait images, and deduplicated by perceptual hash (dHash). A candidate that
+looks like an image already chosen for another card is rejected. The best
+remaining candidate is written atomically. Its source URL, sha256 and hash go
+to `images/sources.json`. Cards listed there, or whose image is already in the
+folder (such as the curated deck), are skipped, so an interrupted run resumes
+where it stopped and existing images are only replaced with --force.
+
+Google Images is searched through icrawler by default. Pass --source-url to use
+any HTTP service answering `GET /search?q=...&n=...` with {"results": [url, ...]},
+e.g. the local stand-in in benchmarks/fake_image_search.py.
+
+    python download-images.py [--workers 8] [--cards fool magician] [--force]
+"""
 import os
-from icrawler.builtin import GoogleImageCrawler
-from icrawler.downloader import ImageDownloader
-
-
-# Custom downloader that renames files using a filename map
-class RenamingImageDownloader(ImageDownloader):
-    def __init__(self, *args, **kwargs):
-        self.filename_map = {}
-        self.counter = 0
-        super().__init__(*args, **kwargs)
-
-    def get_filename(self, task, default_ext):
-        filename = self.filename_map.get(self.counter)
-        if filename:
-            filename = filename
-        else:
-            filename = f"{str(self.counter).zfill(7)}{default_ext}"
-        self.counter += 1
-        return filename
-
-
-# Tarot card search queries and desired filenames
-cards = {
-    "Ace of Cups": "ace-of-cups",
-    "Two of Wands": "two-of-wands",
-    "Three of Pentacles": "three-of-pentacles",
-    "Four of Swords": "four-of-swords",
-    "Five of Cups": "five-of-cups",
-    "Six of Pentacles": "six-of-pentacles",
-    "Seven of Wands": "seven-of-wands",
-    "Eight of Swords": "eight-of-swords",
-    "Nine of Pentacles": "nine-of-pentacles",
-    "Ten of Wands": "ten-of-wands"
-}
+import io
+import re
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+from tarot_cards import tarot_cards
 
 deck_name = "Heaven and Earth Tarot"
 image_suffix = "site:pinterest.com -hands -background -spread -box"
 
-# Ensure output folder exists
-output_dir = "./images"
-os.makedirs(output_dir, exist_ok=True)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(BASE_DIR, "images")
+SOURCES_NAME = "sources.json"
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) tarot-image-fetch"
+MIN_SHORT_SIDE = 300
+# dHash bits that may differ for two images to count as the same picture
+DUPLICATE_DISTANCE = 6
+
+logger = logging.getLogger("download_images")
+
+
+def card_queries(raw_cards=tarot_cards):
+    """(file stem, search query) for every card, the query built from the English name."""
+    queries = []
+    for raw in raw_cards:
+        stem = os.path.splitext(os.path.basename(raw["image_path"]))[0]
+        english = re.search(r"\(([^)]+)\)", raw["name"])
+        title = (english.group(1) if english else raw["name"]).split("–")[0].strip()
+        queries.append((stem, f"{title} {deck_name} {image_suffix}"))
+    return queries
+
+
+# --- Candidate sources ---
+class GoogleSource:
+    """Candidate URLs from Google Images via icrawler, without downloading anything."""
+
+    def candidates(self, query, limit):
+        from icrawler.builtin import GoogleImageCrawler
+        from icrawler.downloader import ImageDownloader
+
+        urls = []
+
+        class UrlCollector(ImageDownloader):
+            def download(self, task, default_ext, timeout=5, max_retry=3, overwrite=False, **kwargs):
+                with self.lock:
+                    if self.reach_max_num():
+                        self.signal.set(reach_max_num=True)
+                        return
+                    self.fetched_num += 1
+                    urls.append(task["file_url"])
+
+        with tempfile.TemporaryDirectory() as scratch:
+            crawler = GoogleImageCrawler(
+                downloader_cls=UrlCollector, downloader_threads=1, storage={"root_dir": scratch}
+            )
+            crawler.crawl(keyword=query, max_num=limit)
+        return urls
+
+
+class HttpSource:
+    """Candidate URLs from a JSON search endpoint, e.g. a local stand-in for tests."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def candidates(self, query, limit):
+        url = f"{self.base_url}/search?" + urllib.parse.urlencode({"q": query, "n": limit})
+        return json.loads(fetch(url))["results"][:limit]
+
+
+# --- Images ---
+def fetch(url, timeout=15, retries=3):
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    for attempt in range(retries):
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.read()
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def dhash(img, size=8):
+    """64-bit difference hash: robust to rescaling and recompression."""
+    gray = img.convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def load_candidate(url):
+    """Download and decode one candidate; None if it is unusable."""
+    try:
+        data = fetch(url)
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            width, height = img.size
+            if min(width, height) < MIN_SHORT_SIDE or width >= height:
+                return None
+            return {
+                "url": url,
+                "data": data,
+                "format": img.format,
+                "width": width,
+                "height": height,
+                "dhash": dhash(img),
+            }
+    except Exception as e:
+        logger.debug(f"Candidate {url} rejected: {e}")
+        return None
+
+
+def write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def as_jpeg(candidate):
+    if candidate["format"] == "JPEG":
+        return candidate["data"]
+    with Image.open(io.BytesIO(candidate["data"])) as img:
+        out = io.BytesIO()
+        img.convert("RGB").save(out, "JPEG", quality=92)
+        return out.getvalue()
+
+
+# --- Pipeline ---
+class Pipeline:
+    def __init__(self, source, output_dir=OUTPUT_DIR, candidates=8, force=False):
+        self.source = source
+        self.output_dir = output_dir
+        self.candidate_limit = candidates
+        self.sources_path = os.path.join(output_dir, SOURCES_NAME)
+        self._lock = threading.Lock()
+        self.sources = {} if force else self._load_sources()
+
+    def _load_sources(self):
+        try:
+            with open(self.sources_path, encoding="utf-8") as f:
+                sources = json.load(f)
+        except FileNotFoundError:
+            sources = {}
+        # Only entries whose image is still on disk count as done
+        sources = {
+            stem: entry
+            for stem, entry in sources.items()
+            if os.path.isfile(os.path.join(self.output_dir, entry["file"]))
+        }
+        # Images without a recorded source count as done too, and take part in
+        # duplicate detection
+        if os.path.isdir(self.output_dir):
+            for file_name in sorted(os.listdir(self.output_dir)):
+                stem, ext = os.path.splitext(file_name)
+                if ext == ".jpg" and stem not in sources:
+                    entry = self._describe_existing(file_name)
+                    if entry is not None:
+                        sources[stem] = entry
+        return sources
+
+    def _describe_existing(self, file_name):
+        path = os.path.join(self.output_dir, file_name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            with Image.open(io.BytesIO(data)) as img:
+                img.load()
+                return {
+                    "file": file_name,
+                    "query": None,
+                    "url": None,
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                    "dhash": f"{dhash(img):016x}",
+                    "width": img.width,
+                    "height": img.height,
+                    "fetched_at": None,
+                }
+        except Exception as e:
+            logger.warning(f"{file_name} is unreadable, it will be fetched again: {e}")
+            return None
+
+    def done(self, stem):
+        return stem in self.sources
 
-# Run the crawler for each tarot card
-for card_name, base_filename in cards.items():
-    search_query = f"{card_name} {deck_name} {image_suffix}"
-    print(f"\n📥 Downloading: {search_query} -> {base_filename}")
+    def _claim(self, stem, query, candidate):
+        """Record a candidate for a card unless another card already uses the same picture."""
+        with self._lock:
+            for other, entry in self.sources.items():
+                if other != stem and hamming(int(entry["dhash"], 16), candidate["dhash"]) <= DUPLICATE_DISTANCE:
+                    logger.info(f"{stem}: candidate duplicates {other}, trying the next one")
+                    return False
+            data = as_jpeg(candidate)
+            file_name = f"{stem}.jpg"
+            write_atomic(os.path.join(self.output_dir, file_name), data)
+            self.sources[stem] = {
+                "file": file_name,
+                "query": query,
+                "url": candidate["url"],
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "dhash": f"{candidate['dhash']:016x}",
+                "width": candidate["width"],
+                "height": candidate["height"],
+                "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+            write_atomic(
+                self.sources_path,
+                json.dumps(self.sources, indent=2, sort_keys=True, ensure_ascii=False).encode("utf-8"),
+            )
+            return True
 
-    # Map for 5 images
-    filename_map = {i: f"{base_filename}-{i+1}.jpg" for i in range(5)}
+    def fetch_card(self, stem, query):
+        urls = self.source.candidates(query, self.candidate_limit)
+        unique = []
+        for url in urls:
+            candidate = load_candidate(url)
+            if candidate is None:
+                continue
+            if any(hamming(candidate["dhash"], kept["dhash"]) <= DUPLICATE_DISTANCE for kept in unique):
+                continue
+            unique.append(candidate)
+        # Largest portrait image first
+        unique.sort(key=lambda c: c["width"] * c["height"], reverse=True)
+        for candidate in unique:
+            if self._claim(stem, query, candidate):
+                return True
+        logger.warning(f"{stem}: none of {len(urls)} candidates usable")
+        return False
 
-    # Set up the crawler and manually assign the filename_map
-    crawler = GoogleImageCrawler(
-        downloader_cls=RenamingImageDownloader,
-        downloader_threads=4,
-        storage={'root_dir': output_dir}
-    )
+    def run(self, queries, workers=8):
+        pending = [(stem, query) for stem, query in queries if not self.done(stem)]
+        logger.info(f"{len(queries) - len(pending)} cards already fetched, {len(pending)} to go")
+        started = time.monotonic()
+        fetched, failed = 0, []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.fetch_card, stem, query): stem for stem, query in pending}
+            for future in as_completed(futures):
+                stem = futures[future]
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    logger.error(f"{stem}: {e}")
+                    ok = False
+                if ok:
+                    fetched += 1
+                    logger.info(f"📥 {stem} ({fetched}/{len(pending)})")
+                else:
+                    failed.append(stem)
+        logger.info(f"Fetched {fetched} cards in {time.monotonic() - started:.1f}s, failed: {failed or 'none'}")
+        return fetched, failed
 
-    # Set the filename map on the actual downloader instance
-    crawler.downloader.filename_map = filename_map
 
-    # Start crawling
-    crawler.crawl(keyword=search_query, max_num=5)
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--candidates", type=int, default=8, help="candidate images per card")
+    parser.add_argument("--source-url", help="JSON search endpoint to use instead of Google")
+    parser.add_argument("--output", default=OUTPUT_DIR)
+    parser.add_argument("--cards", nargs="*", help="only these card file stems")
+    parser.add_argument("--force", action="store_true", help="refetch every card, replacing existing images")
+    args = parser.parse_args()
 
-print("\n✅ Download complete. Check the 'images' folder.")
+    os.makedirs(args.output, exist_ok=True)
+    queries = card_queries()
+    if args.cards:
+        queries = [(stem, query) for stem, query in queries if stem in set(args.cards)]
+    source = HttpSource(args.source_url) if args.source_url else GoogleSource()
+    _, failed = Pipeline(source, args.output, args.candidates, args.force).run(queries, args.workers)
+    print("\n✅ Download complete. Check the 'images' folder." if not failed else f"\n⚠️ Failed: {', '.join(failed)}")
@@ -0,0 +1,102 @@
+"""
+Hedged requests: if the primary call has not answered within a latency
+threshold, start a backup call and take whichever finishes first.
+"""
+import time
+import asyncio
+from collections import deque
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies (seconds) with percentile lookup."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    def summary(self):
+        return {
+            "samples": len(self._samples),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class HedgeStats:
+    def __init__(self):
+        self.requests = 0
+        self.hedged = 0
+        self.primary_wins = 0
+        self.backup_wins = 0
+        self.primary_win_latency = LatencyTracker()
+        self.backup_win_latency = LatencyTracker()
+
+    @property
+    def hedge_rate(self):
+        return self.hedged / self.requests if self.requests else 0.0
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedge_rate, 4),
+            "primary_wins": self.primary_wins,
+            "backup_wins": self.backup_wins,
+            "primary_win_latency": self.primary_win_latency.summary(),
+            "backup_win_latency": self.backup_win_latency.summary(),
+        }
+
+
+async def hedged(primary, backup, threshold, stats):
+    """
+    Await `primary()`; if it is still running after `threshold` seconds, also start
+    `backup()`. The first successful result wins and the other call is cancelled.
+    If one call fails, the other one's outcome is used. Cancelling the hedge
+    cancels whichever calls are still running.
+    """
+    stats.requests += 1
+    started = time.monotonic()
+    primary_task = asyncio.ensure_future(primary())
+    pending = {primary_task}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=threshold)
+        if done:
+            if primary_task.exception() is not None:
+                raise primary_task.exception()
+            stats.primary_wins += 1
+            stats.primary_win_latency.record(time.monotonic() - started)
+            return primary_task.result()
+
+        stats.hedged += 1
+        pending.add(asyncio.ensure_future(backup()))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                latency = time.monotonic() - started
+                if task is primary_task:
+                    stats.primary_wins += 1
+                    stats.primary_win_latency.record(latency)
+                else:
+                    stats.backup_wins += 1
+                    stats.backup_win_latency.record(latency)
+                return task.result()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -1,11 +1,21 @@
+import os
+import asyncio
 import logging
+from datetime import datetime, time, timedelta
+import pytz
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.ext import CallbackContext, CallbackQueryHandler, CommandHandler
-import google.generativeai as genai
-from ai_prompt import generate_horoscope_prompt
+import ai_cache
+from ai_client import HOROSCOPE_MODEL, generate_text
+from ai_scheduler import INTERACTIVE, PREGEN
+from ai_prompt import HOROSCOPE_PROMPT_VERSION, generate_horoscope_prompt
 from utils import sanitize_markdown
 
+HOROSCOPE_PREWARM_TIME = os.getenv("HOROSCOPE_PREWARM_TIME", "00:05")
+# Two days, so yesterday's text is still cached as a fallback for all of today
+HOROSCOPE_CACHE_TTL_SECONDS = int(os.getenv("HOROSCOPE_CACHE_TTL_SECONDS", str(48 * 3600)))
+
 logger = logging.getLogger(__name__)
 
 ZODIAC_SIGNS = [
@@ -13,6 +23,86 @@ ZODIAC_SIGNS = [
     "Весы", "Скорпион", "Стрелец", "Козерог", "Водолей", "Рыбы"
 ]
 
+# (day, sign) -> horoscope text for the current UTC day
+_horoscopes = {}
+# (day, sign) -> (task generating that horoscope, its priority), shared by concurrent callers
+_in_flight = {}
+
+
+def _cache_key(day, sign):
+    return ai_cache.make_key(
+        "horoscope", HOROSCOPE_PROMPT_VERSION, HOROSCOPE_MODEL,
+        sign=sign, day=day.isoformat(),
+    )
+
+
+async def _generate_horoscope(day, sign, priority):
+    prompt = generate_horoscope_prompt(sign)
+    text = await ai_cache.get_or_generate(
+        _cache_key(day, sign),
+        lambda: generate_text(prompt, HOROSCOPE_MODEL, priority=priority),
+        ttl=HOROSCOPE_CACHE_TTL_SECONDS,
+    )
+    return text.lstrip("#").strip()
+
+
+async def _fallback_horoscope(day, sign):
+    """Yesterday's horoscope for the sign, if it is still cached."""
+    text = await ai_cache.get(_cache_key(day - timedelta(days=1), sign), HOROSCOPE_CACHE_TTL_SECONDS)
+    return text.lstrip("#").strip() if text else None
+
+
+async def get_horoscope(sign, priority=INTERACTIVE):
+    """
+    Today's horoscope for a sign, generated at most once per day: answered from
+    memory when ready, otherwise joined onto the in-flight generation. An
+    interactive caller does not join a pre-warm generation, which may still be
+    queued behind other pre-generation work; it starts its own INTERACTIVE one,
+    and later callers join that instead.
+    """
+    day = datetime.now(pytz.UTC).date()
+    text = _horoscopes.get((day, sign))
+    if text is not None:
+        return text
+
+    task, task_priority = _in_flight.get((day, sign), (None, None))
+    if task is None or (priority == INTERACTIVE and task_priority != INTERACTIVE):
+        task = asyncio.ensure_future(_generate_horoscope(day, sign, priority))
+        _in_flight[(day, sign)] = (task, priority)
+
+        def store(done):
+            if _in_flight.get((day, sign), (None,))[0] is done:
+                del _in_flight[(day, sign)]
+            if not done.cancelled() and done.exception() is None:
+                for stale in [k for k in _horoscopes if k[0] != day]:
+                    del _horoscopes[stale]
+                _horoscopes[(day, sign)] = done.result()
+
+        task.add_done_callback(store)
+
+    try:
+        # shield: one impatient caller must not cancel the generation for everyone else
+        return await asyncio.shield(task)
+    except Exception as e:
+        fallback = await _fallback_horoscope(day, sign)
+        if fallback is None:
+            raise
+        logger.warning(f"AI unavailable ({type(e).__name__}: {e}), serving yesterday's horoscope for {sign}")
+        return fallback
+
+
+async def prewarm_horoscopes(context: CallbackContext = None) -> None:
+    """Generate today's horoscope for every sign. Runs shortly after midnight UTC."""
+    results = await asyncio.gather(
+        *(get_horoscope(sign, PREGEN) for sign in ZODIAC_SIGNS), return_exceptions=True
+    )
+    failed = [sign for sign, result in zip(ZODIAC_SIGNS, results) if isinstance(result, Exception)]
+    if failed:
+        logger.error(f"Horoscope pre-warm failed for {', '.join(failed)}")
+    else:
+        logger.info("Horoscopes pre-warmed for all signs 🌟")
+
+
 async def horoscope_command(update: Update, context: CallbackContext) -> None:
     keyboard = [
         [InlineKeyboardButton(sign, callback_data=f'zodiac_{sign}')] for sign in ZODIAC_SIGNS
@@ -25,12 +115,13 @@ async def zodiac_selected(update: Update, context: CallbackContext) -> None:
     await query.answer()
     sign = query.data.replace('zodiac_', '')
 
-    await query.message.reply_text(f"🔮 Подготавливаю гороскоп для *{sign}*...", parse_mode=ParseMode.MARKDOWN)
-    prompt = generate_horoscope_prompt(sign)
+    if sign not in ZODIAC_SIGNS:
+        return
+
+    if (datetime.now(pytz.UTC).date(), sign) not in _horoscopes:
+        await query.message.reply_text(f"🔮 Подготавливаю гороскоп для *{sign}*...", parse_mode=ParseMode.MARKDOWN)
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-001')
-        response = model.generate_content(prompt)
-        text_response = response.text.lstrip("#").strip()
+        text_response = await get_horoscope(sign)
         safe_text = sanitize_markdown(text_response)
         await query.message.reply_text(f"🌟 Гороскоп для *{sign}*:\n\n{safe_text}", parse_mode=ParseMode.MARKDOWN)
     except Exception as e:
@@ -40,3 +131,12 @@ async def zodiac_selected(update: Update, context: CallbackContext) -> None:
 def register_horoscope_handlers(application):
     application.add_handler(CommandHandler("horoscope", horoscope_command))
     application.add_handler(CallbackQueryHandler(zodiac_selected, pattern=r'^zodiac_'))
+
+    hour, minute = (int(part) for part in HOROSCOPE_PREWARM_TIME.split(":"))
+    application.job_queue.run_daily(
+        prewarm_horoscopes,
+        time=time(hour=hour, minute=minute, tzinfo=pytz.UTC),
+        name="horoscope_prewarm",
+    )
+    # Warm today's horoscopes right after startup too
+    application.job_queue.run_once(prewarm_horoscopes, when=5, name="horoscope_prewarm_startup")
@@ -0,0 +1,99 @@
+"""
+Immutable in-memory store of card image bytes, filled once at startup.
+
+Cards are served from the derivatives produced by `build_assets.py` when the
+manifest lists them and their sha256 still matches; otherwise from the original
+file. Sends read bytes from memory and never touch the filesystem.
+"""
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from collections import namedtuple
+from types import MappingProxyType
+
+from dotenv import load_dotenv
+
+load_dotenv()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.getenv("CARD_ASSETS_DIR", os.path.join(BASE_DIR, "assets"))
+MANIFEST_NAME = "manifest.json"
+
+logger = logging.getLogger(__name__)
+
+StoredImage = namedtuple("StoredImage", "data content_hash source")
+
+_images = MappingProxyType({})
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _load_manifest(assets_dir):
+    try:
+        with open(os.path.join(assets_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f).get("cards", {})
+    except FileNotFoundError:
+        logger.warning(f"No asset manifest in {assets_dir}, serving original images")
+    except ValueError as e:
+        logger.error(f"Unreadable asset manifest in {assets_dir}: {e}")
+    return {}
+
+
+def _load_one(image_path, entry, assets_dir):
+    if entry:
+        try:
+            data = _read(os.path.join(assets_dir, entry["file"]))
+            content_hash = hashlib.sha256(data).hexdigest()
+            if content_hash == entry["sha256"]:
+                return StoredImage(data, content_hash, "asset")
+            logger.warning(f"Asset for {image_path} does not match the manifest, using the original")
+        except OSError as e:
+            logger.warning(f"Asset for {image_path} unreadable ({e}), using the original")
+    data = _read(os.path.join(BASE_DIR, image_path))
+    return StoredImage(data, hashlib.sha256(data).hexdigest(), "original")
+
+
+def load(image_paths, assets_dir=ASSETS_DIR):
+    """Read every image into memory and publish the store. Blocking; see `preload`."""
+    global _images
+    manifest = _load_manifest(assets_dir)
+    images = {}
+    for image_path in image_paths:
+        try:
+            images[image_path] = _load_one(image_path, manifest.get(image_path), assets_dir)
+        except OSError as e:
+            logger.error(f"Cannot load image {image_path}: {e}")
+    _images = MappingProxyType(images)
+    from_assets = sum(1 for image in images.values() if image.source == "asset")
+    total = sum(len(image.data) for image in images.values())
+    logger.info(
+        f"Image store ready: {len(images)} images ({from_assets} optimised), {total / 1e6:.1f} MB"
+    )
+    return _images
+
+
+async def preload(image_paths, assets_dir=ASSETS_DIR):
+    """Fill the store off the event loop."""
+    return await asyncio.to_thread(load, list(image_paths), assets_dir)
+
+
+def get(image_path):
+    """Bytes and content hash for an image. Images missing from the store are read
+    from disk, which only happens if `preload` was skipped."""
+    image = _images.get(image_path)
+    if image is None:
+        logger.warning(f"{image_path} not preloaded, reading it from disk")
+        image = _load_one(image_path, None, ASSETS_DIR)
+    return image
+
+
+def stats():
+    return {
+        "images": len(_images),
+        "bytes": sum(len(image.data) for image in _images.values()),
+        "optimised": sum(1 for image in _images.values() if image.source == "asset"),
+    }
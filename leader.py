@@ -0,0 +1,62 @@
+"""
+Leader election over a Postgres session advisory lock. Every bot/worker process
+competes for the lock; the holder owns delivery scheduling so jobs fire once.
+The lock lives on a dedicated connection and is released if that session dies.
+"""
+import os
+import logging
+
+from dotenv import load_dotenv
+
+import repository
+
+load_dotenv()
+LEADER_LOCK_ID = int(os.getenv("LEADER_LOCK_ID", "7307307"))
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    def __init__(self, lock_id=LEADER_LOCK_ID):
+        self.lock_id = lock_id
+        self.is_leader = False
+        self._connection = None
+
+    async def refresh(self, context=None):
+        """Try to take (or confirm) leadership. Usable as a repeating job callback."""
+        was_leader = self.is_leader
+        try:
+            if self._connection is None or self._connection.is_closed():
+                self.is_leader = False
+                self._connection = await repository.connect()
+            if self.is_leader:
+                await self._connection.fetchval("SELECT 1")
+            else:
+                self.is_leader = await self._connection.fetchval(
+                    "SELECT pg_try_advisory_lock($1)", self.lock_id
+                )
+        except Exception as e:
+            logger.error(f"Leader lock error: {e}")
+            self.is_leader = False
+            await self._close()
+
+        if self.is_leader != was_leader:
+            logger.info("Became scheduling leader 👑" if self.is_leader else "Lost scheduling leadership")
+        return self.is_leader
+
+    async def release(self):
+        if self._connection is not None and self.is_leader:
+            try:
+                await self._connection.fetchval("SELECT pg_advisory_unlock($1)", self.lock_id)
+            except Exception as e:
+                logger.error(f"Leader unlock error: {e}")
+        self.is_leader = False
+        await self._close()
+
+    async def _close(self):
+        if self._connection is not None:
+            try:
+                await self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
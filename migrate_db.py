@@ -1,33 +1,15 @@
-import os
-import psycopg2
-from dotenv import load_dotenv
+import asyncio
+import logging
 
-# Load environment variables
-load_dotenv()
+from migrations import migrate
 
-# Database connection
-DATABASE_URL = os.getenv("DATABASE_URL2")
+logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 
-try:
-    connection = psycopg2.connect(DATABASE_URL)
-    cursor = connection.cursor()
-
-    # Alter table query
-    alter_table_query = """
-    ALTER TABLE users
-    ADD COLUMN name VARCHAR(255),
-    ADD COLUMN gender VARCHAR(10) CHECK (gender IN ('Мужчина', 'Женщина'));
-    """
-    
-    cursor.execute(alter_table_query)
-    connection.commit()
-
-    print("Database updated successfully!")
-
-except Exception as e:
-    print(f"Error: {e}")
-
-finally:
-    if connection:
-        cursor.close()
-        connection.close()
+# Apply pending schema migrations; safe to run any number of times
+if __name__ == "__main__":
+    try:
+        applied = asyncio.run(migrate())
+        print(f"Database updated successfully! Applied: {applied or 'nothing'}")
+    except Exception as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
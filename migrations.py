@@ -0,0 +1,125 @@
+"""
+Versioned schema migrations. Each entry in MIGRATIONS runs once, in order, in its
+own transaction; applied versions are recorded in `schema_migrations`. A session
+advisory lock serialises concurrent runners (bot and worker starting together).
+
+Append new migrations at the end and never edit one that has shipped.
+"""
+import os
+import logging
+
+from dotenv import load_dotenv
+
+import repository
+
+load_dotenv()
+MIGRATION_LOCK_ID = int(os.getenv("MIGRATION_LOCK_ID", "7307308"))
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = [
+    (1, "users table with name and gender", """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            start_date TIMESTAMP,
+            last_visited TIMESTAMP,
+            subscribed BOOLEAN DEFAULT FALSE,
+            timezone TEXT
+        );
+        ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS name VARCHAR(255),
+            ADD COLUMN IF NOT EXISTS gender VARCHAR(10) CHECK (gender IN ('Мужчина', 'Женщина')),
+            ADD COLUMN IF NOT EXISTS subscribed BOOLEAN DEFAULT FALSE,
+            ADD COLUMN IF NOT EXISTS timezone TEXT;
+    """),
+    (2, "card_images, card_interpretations, ai_cache and delivery_outbox", """
+        CREATE TABLE IF NOT EXISTS card_images (
+            image_path TEXT NOT NULL,
+            content_hash CHAR(64) NOT NULL,
+            file_id TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (image_path, content_hash)
+        );
+        CREATE TABLE IF NOT EXISTS card_interpretations (
+            card_name TEXT NOT NULL,
+            generated_for DATE NOT NULL,
+            variant SMALLINT NOT NULL,
+            text TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (generated_for, card_name, variant)
+        );
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            cache_key CHAR(64) PRIMARY KEY,
+            text TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS delivery_outbox (
+            user_id BIGINT NOT NULL,
+            delivery_date DATE NOT NULL,
+            timezone TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'sending', 'sent', 'dead')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            claimed_at TIMESTAMPTZ,
+            sent_at TIMESTAMPTZ,
+            last_error TEXT,
+            PRIMARY KEY (user_id, delivery_date)
+        );
+        CREATE INDEX IF NOT EXISTS delivery_outbox_due_idx
+            ON delivery_outbox (next_attempt_at) WHERE status IN ('pending', 'sending');
+    """),
+    (3, "normalised non-null delivery_timezone on users", """
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS delivery_timezone TEXT NOT NULL
+            GENERATED ALWAYS AS (COALESCE(timezone, 'Europe/London')) STORED;
+    """),
+    # Covers the distinct-timezone scan and the per-timezone subscriber fetch
+    # as index-only scans; user_id rides along so the heap is never visited.
+    (4, "partial index on subscribed users by delivery_timezone", """
+        CREATE INDEX IF NOT EXISTS users_subscribed_timezone_idx
+            ON users (delivery_timezone, user_id) WHERE subscribed;
+    """),
+]
+
+CREATE_SCHEMA_MIGRATIONS = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+SELECT_APPLIED_VERSIONS = "SELECT version FROM schema_migrations"
+
+INSERT_APPLIED_VERSION = "INSERT INTO schema_migrations (version, description) VALUES ($1, $2)"
+
+
+async def migrate(application=None):
+    """Apply every pending migration. Usable as part of an Application post_init hook.
+    Returns the list of versions applied by this call."""
+    applied_now = []
+    connection = await repository.connect()
+    try:
+        await connection.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            await connection.execute(CREATE_SCHEMA_MIGRATIONS)
+            applied = {row[0] for row in await connection.fetch(SELECT_APPLIED_VERSIONS)}
+            for version, description, sql in MIGRATIONS:
+                if version in applied:
+                    continue
+                async with connection.transaction():
+                    await connection.execute(sql)
+                    await connection.execute(INSERT_APPLIED_VERSION, version, description)
+                applied_now.append(version)
+                logger.info(f"Applied migration {version}: {description}")
+        finally:
+            await connection.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+    finally:
+        await connection.close()
+    if not applied_now:
+        logger.info("Database schema is up to date")
+    return applied_now
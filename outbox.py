@@ -0,0 +1,173 @@
+"""
+Worker for the Postgres delivery outbox: one row per user per delivery day.
+The worker runs several independent slots. Each claims a small batch, sends it
+row by row and marks it sent, or reschedules failures with exponential backoff
+until they end up dead-lettered. A slow chat (flood-wait retries, a live AI
+generation) holds up only its own slot, and a slot renews its lease while it
+works so no other worker re-claims rows it has yet to send.
+
+Failures that mean the chat is gone for good (the user blocked the bot, deleted
+their account) are not retried: the row is dead-lettered and the user
+unsubscribed in one batched update per claim, so later runs neither enqueue them
+nor spend AI calls on them.
+"""
+import os
+import time
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+from telegram.error import BadRequest, Forbidden
+
+import repository
+from broadcast import BROADCAST_CONCURRENCY
+
+load_dotenv()
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "10"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "30"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+_worker = None
+_counters = {"sent": 0, "failed": 0, "pruned_chats": 0, "lease_renewals": 0, "lease_lost": 0}
+
+# BadRequest texts that mean the chat no longer exists, as opposed to a bad payload
+GONE_CHAT_MESSAGES = ("chat not found", "user is deactivated", "peer_id_invalid")
+
+
+def is_chat_gone(error):
+    """True if Telegram says this chat can never be delivered to again."""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(
+        text in str(error).lower() for text in GONE_CHAT_MESSAGES
+    )
+
+
+async def prune(gone):
+    """Unsubscribe unreachable chats in one batch."""
+    pruned = await repository.prune_unreachable_chats(gone)
+    _counters["pruned_chats"] += pruned
+    logger.info(
+        f"Unsubscribed {pruned} unreachable chats ({_counters['pruned_chats']} pruned since start)"
+    )
+
+
+def _key(row):
+    return row["user_id"], row["delivery_date"]
+
+
+async def process_batch(send, limit=OUTBOX_BATCH_SIZE):
+    """
+    Claim up to `limit` rows and deliver them one after another. `send(user_id, day)`
+    must raise (or return False) on failure. Returns the number of rows claimed.
+
+    Once a quarter of the lease has passed the remaining rows' lease is renewed;
+    rows another worker has re-claimed in the meantime are skipped, not sent twice.
+    """
+    rows = await repository.claim_deliveries(limit, OUTBOX_LEASE_SECONDS)
+    if not rows:
+        return 0
+
+    sent, failures, gone = [], [], []
+    remaining = list(rows)
+    # (user_id, delivery_date) -> claimed_at of our lease on that row
+    leases = {_key(row): row["claimed_at"] for row in rows}
+    renewed_at = time.monotonic()
+    try:
+        while remaining:
+            if time.monotonic() - renewed_at >= OUTBOX_LEASE_SECONDS / 4:
+                leases = await repository.renew_delivery_leases(
+                    {_key(row): leases[_key(row)] for row in remaining}
+                )
+                renewed_at = time.monotonic()
+                _counters["lease_renewals"] += 1
+                held = [row for row in remaining if _key(row) in leases]
+                if len(held) < len(remaining):
+                    _counters["lease_lost"] += len(remaining) - len(held)
+                    logger.warning(f"Lease lost on {len(remaining) - len(held)} deliveries, skipping them")
+                remaining = held
+                continue
+
+            row = remaining.pop(0)
+            try:
+                ok = await send(row["user_id"], row["delivery_date"])
+            except Exception as e:
+                if is_chat_gone(e):
+                    gone.append((row, f"chat gone: {type(e).__name__}: {e}"))
+                else:
+                    logger.error(f"Failed send → {row['user_id']}: {e}")
+                    failures.append((row, f"{type(e).__name__}: {e}"))
+                continue
+            if ok is False:
+                failures.append((row, "send returned False"))
+            else:
+                sent.append(row)
+    finally:
+        # Also on cancellation (shutdown, deploy): record what was already delivered,
+        # or those rows would be sent again once their lease expires
+        await asyncio.shield(_settle(sent, failures, gone))
+    return len(rows)
+
+
+async def _settle(sent, failures, gone):
+    """Record the outcome of a claimed batch: sent, pruned, or rescheduled/dead-lettered."""
+    _counters["sent"] += len(sent)
+    _counters["failed"] += len(failures) + len(gone)
+    await repository.mark_deliveries_sent(sent)
+    if gone:
+        await prune(gone)
+    await repository.mark_deliveries_failed(
+        failures, OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_BASE_SECONDS, OUTBOX_BACKOFF_MAX_SECONDS
+    )
+    dead = [row for row, _ in failures if row["attempts"] >= OUTBOX_MAX_ATTEMPTS]
+    if dead:
+        logger.warning(f"Dead-lettered {len(dead)} deliveries: {[row['user_id'] for row in dead]}")
+
+
+async def run_slot(send):
+    """Claim and deliver batches until cancelled, polling while the outbox is drained."""
+    while True:
+        try:
+            claimed = await process_batch(send)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Outbox worker error: {e}")
+            claimed = 0
+        if claimed < OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(OUTBOX_POLL_SECONDS)
+
+
+async def run_worker(send, concurrency=BROADCAST_CONCURRENCY):
+    """Run `concurrency` independent slots until cancelled; the bot's rate limiter
+    paces the actual Bot API calls."""
+    await asyncio.gather(*(run_slot(send) for _ in range(max(1, concurrency))))
+
+
+def stats():
+    return dict(_counters)
+
+
+def start_worker(send):
+    global _worker
+    if _worker is None:
+        _worker = asyncio.create_task(run_worker(send))
+        logger.info("Outbox worker started")
+    return _worker
+
+
+async def stop_worker():
+    global _worker
+    if _worker is not None:
+        _worker.cancel()
+        try:
+            await _worker
+        except asyncio.CancelledError:
+            pass
+        _worker = None
+        logger.info("Outbox worker stopped")
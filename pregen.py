@@ -0,0 +1,94 @@
+import os
+import time
+import random
+import logging
+
+from dotenv import load_dotenv
+
+import repository
+from tarot_batch import generate_tarot_batch
+from deck import deck
+
+load_dotenv()
+PREGEN_VARIANTS = int(os.getenv("PREGEN_VARIANTS", "3"))
+PREGEN_LEAD_MINUTES = int(os.getenv("PREGEN_LEAD_MINUTES", "30"))
+# A pool missing cards (pre-generation failed or is still running, possibly in
+# another process) is reloaded this often instead of being kept all day
+PREGEN_POOL_RELOAD_SECONDS = float(os.getenv("PREGEN_POOL_RELOAD_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+# day -> {card_name: [texts]}, only the most recent days are kept
+_pools = {}
+# day -> monotonic time after which an incomplete pool is reloaded
+_reload_at = {}
+_POOLS_KEPT = 3
+
+
+async def pregenerate_interpretations(day, variants=PREGEN_VARIANTS):
+    """
+    Fill the interpretation pool for `day` up to `variants` texts per card.
+    Cards that already have enough variants (e.g. from an earlier timezone) are skipped.
+    """
+    existing = await repository.count_card_interpretations(day)
+    missing = [
+        (card.name, variant)
+        for card in deck
+        for variant in range(existing.get(card.name, 0), variants)
+    ]
+    if not missing:
+        return 0
+
+    logger.info(f"Pre-generating {len(missing)} interpretations for {day}")
+    texts = await generate_tarot_batch([card_name for card_name, _ in missing])
+    generated = 0
+
+    for (card_name, variant), text in zip(missing, texts):
+        if text is None:
+            continue
+        try:
+            await repository.save_card_interpretation(card_name, day, variant, text)
+            generated += 1
+        except Exception as e:
+            logger.error(f"Pre-generation error for {card_name}: {e}")
+
+    _pools.pop(day, None)
+    _reload_at.pop(day, None)
+    logger.info(f"Pre-generated {generated}/{len(missing)} interpretations for {day}")
+    return generated
+
+
+async def get_interpretation_pool(day):
+    """Return {card_name: [texts]} for `day`. A pool with a text for every card is
+    loaded from the database once; an incomplete one is reloaded periodically."""
+    pool = _pools.get(day)
+    if pool is None or time.monotonic() >= _reload_at.get(day, float("inf")):
+        pool = await repository.get_card_interpretations(day)
+        _pools[day] = pool
+        if all(pool.get(card.name) for card in deck):
+            _reload_at.pop(day, None)
+        else:
+            _reload_at[day] = time.monotonic() + PREGEN_POOL_RELOAD_SECONDS
+        for stale in sorted(_pools)[:-_POOLS_KEPT]:
+            del _pools[stale]
+            _reload_at.pop(stale, None)
+    return pool
+
+
+def draw_interpretation(pool, card_name):
+    """Pick one stored variant for the card, or None if the pool has none."""
+    texts = pool.get(card_name)
+    return random.choice(texts) if texts else None
+
+
+async def fallback_interpretation(card_name):
+    """Any previously generated text for the card: newest in-memory pool first, then the database."""
+    for day in sorted(_pools, reverse=True):
+        text = draw_interpretation(_pools[day], card_name)
+        if text is not None:
+            return text
+    try:
+        return await repository.get_latest_card_interpretation(card_name)
+    except Exception as e:
+        logger.error(f"Fallback lookup error for {card_name}: {e}")
+        return None
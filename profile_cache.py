@@ -0,0 +1,45 @@
+"""
+Write-behind buffering of user activity (username / names / last_visited) from
+/start: visits are collected in memory and flushed as one multi-row upsert.
+"""
+import os
+import logging
+
+from dotenv import load_dotenv
+
+import repository
+
+load_dotenv()
+PROFILE_FLUSH_SECONDS = float(os.getenv("PROFILE_FLUSH_SECONDS", "5"))
+PROFILE_FLUSH_BATCH = int(os.getenv("PROFILE_FLUSH_BATCH", "1000"))
+
+logger = logging.getLogger(__name__)
+
+# user_id -> (user_id, username, first_name, last_name), latest wins
+_pending = {}
+_counters = {"flushes": 0, "flushed_rows": 0}
+
+
+def touch(user_id, username, first_name, last_name):
+    """Buffer an activity update; it reaches the database with the next flush."""
+    _pending[user_id] = (user_id, username, first_name, last_name)
+
+
+async def flush(context=None):
+    """Write buffered activity in multi-row upserts. Usable as a repeating job callback."""
+    while _pending:
+        batch = [_pending.pop(user_id) for user_id in list(_pending)[:PROFILE_FLUSH_BATCH]]
+        try:
+            await repository.touch_users(batch)
+        except Exception as e:
+            logger.error(f"Profile flush error ({len(batch)} users): {e}")
+            # Keep the updates for the next flush unless newer ones arrived meanwhile
+            for row in batch:
+                _pending.setdefault(row[0], row)
+            return
+        _counters["flushes"] += 1
+        _counters["flushed_rows"] += len(batch)
+
+
+def stats():
+    return {**_counters, "pending": len(_pending)}
@@ -0,0 +1,219 @@
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, bursting up to `capacity`.
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available right now; never waits."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def set_rate(self, rate):
+        """Change the refill rate; tokens already earned at the old rate are kept."""
+        self._refill()
+        self.rate = float(rate)
+        self.capacity = max(1.0, self.rate)
+        self._tokens = min(self._tokens, self.capacity)
+
+    def time_until_available(self, tokens=1):
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class KeyedTokenBuckets:
+    """One lazily created TokenBucket per key (e.g. per chat), idle buckets are dropped."""
+
+    def __init__(self, rate, capacity=None, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    async def acquire(self, key, tokens=1):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+        await bucket.acquire(tokens)
+
+    def _prune(self):
+        for key, bucket in list(self._buckets.items()):
+            bucket._refill()
+            if bucket._tokens >= bucket.capacity and not bucket._lock.locked():
+                del self._buckets[key]
+
+
+class AdaptiveRateLimiter(BaseRateLimiter):
+    """
+    Rate limiter for every Bot API call made through the Application's bot.
+
+    The global send rate follows AIMD: it grows by `increase_step` msg/s after each
+    `adjust_interval` without trouble, and is cut by `decrease_factor` on a 429
+    RetryAfter (or, more gently, when call latency climbs well above its baseline).
+    A RetryAfter for a chat also puts that chat on cooldown. The failed request is
+    retried with the same prepared payload, so nothing upstream (AI text, captions)
+    is regenerated; waits longer than `max_retry_after` are raised to the caller.
+    """
+
+    def __init__(
+        self,
+        rate=25.0,
+        min_rate=1.0,
+        max_rate=30.0,
+        per_chat_rate=1.0,
+        increase_step=1.0,
+        decrease_factor=0.5,
+        adjust_interval=5.0,
+        latency_factor=3.0,
+        max_retries=3,
+        max_retry_after=60.0,
+    ):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.adjust_interval = adjust_interval
+        self.latency_factor = latency_factor
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.global_bucket = TokenBucket(rate)
+        self.chat_buckets = KeyedTokenBuckets(per_chat_rate)
+        # chat_id -> monotonic time its cooldown ends
+        self._cooldowns = {}
+        self._paused_until = 0.0
+        self._last_adjust = time.monotonic()
+        self._last_decrease = 0.0
+        # endpoint -> [EWMA latency, baseline latency]; uploads and edits differ too much to share one
+        self._latency = {}
+        self.events = deque(maxlen=50)
+        self.counters = {"requests": 0, "retry_after": 0, "retries": 0, "increases": 0, "decreases": 0}
+
+    @property
+    def rate(self):
+        return self.global_bucket.rate
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    # --- AIMD ---
+    def _decrease(self, factor, reason):
+        old = self.rate
+        self.global_bucket.set_rate(max(self.min_rate, old * factor))
+        self._last_adjust = self._last_decrease = time.monotonic()
+        self.counters["decreases"] += 1
+        self.events.append((time.time(), reason, round(old, 2), round(self.rate, 2)))
+        logger.warning(f"Telegram send rate {old:.1f} -> {self.rate:.1f} msg/s ({reason})")
+
+    def _on_success(self, endpoint, latency):
+        tracked = self._latency.get(endpoint)
+        if tracked is None:
+            tracked = self._latency[endpoint] = [latency, latency]
+        else:
+            tracked[0] = 0.8 * tracked[0] + 0.2 * latency
+            # Baseline follows the best recent latency, creeping up slowly so it can recover
+            tracked[1] = min(tracked[0], tracked[1] * 1.01)
+
+        now = time.monotonic()
+        if now - self._last_adjust < self.adjust_interval:
+            return
+        if tracked[0] > tracked[1] * self.latency_factor:
+            self._decrease(0.85, f"{endpoint} latency {tracked[0] * 1000:.0f} ms")
+        elif self.rate < self.max_rate:
+            self.global_bucket.set_rate(min(self.max_rate, self.rate + self.increase_step))
+            self._last_adjust = now
+            self.counters["increases"] += 1
+
+    def _on_retry_after(self, endpoint, chat_id, retry_after):
+        self.counters["retry_after"] += 1
+        until = time.monotonic() + retry_after
+        if chat_id is None:
+            self._paused_until = max(self._paused_until, until)
+        else:
+            self._cooldowns[chat_id] = max(self._cooldowns.get(chat_id, 0.0), until)
+        # 429s for requests already in flight at the old rate are one congestion event, not many
+        if time.monotonic() - self._last_decrease >= self.adjust_interval:
+            self._decrease(
+                self.decrease_factor, f"RetryAfter {retry_after}s on {endpoint} → {chat_id}"
+            )
+
+    async def _wait_cooldown(self, chat_id):
+        while True:
+            until = max(self._paused_until, self._cooldowns.get(chat_id, 0.0))
+            delay = until - time.monotonic()
+            if delay <= 0:
+                self._cooldowns.pop(chat_id, None)
+                return
+            await asyncio.sleep(delay)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        for attempt in range(self.max_retries + 1):
+            await self._wait_cooldown(chat_id)
+            if chat_id is not None:
+                await self.chat_buckets.acquire(chat_id)
+            await self.global_bucket.acquire()
+            self.counters["requests"] += 1
+            started = time.monotonic()
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                retry_after = float(e.retry_after)
+                self._on_retry_after(endpoint, chat_id, retry_after)
+                if attempt == self.max_retries or retry_after > self.max_retry_after:
+                    raise
+                self.counters["retries"] += 1
+                # Jitter so chats released together do not stampede
+                await asyncio.sleep(retry_after + random.uniform(0, 0.5))
+                continue
+            self._on_success(endpoint, time.monotonic() - started)
+            return result
+
+    def stats(self):
+        return {
+            "rate": round(self.rate, 2),
+            "latency_ms": {endpoint: round(ewma * 1000, 1) for endpoint, (ewma, _) in self._latency.items()},
+            "cooling_chats": len(self._cooldowns),
+            **self.counters,
+            "recent_backoffs": list(self.events)[-5:],
+        }
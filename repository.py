@@ -0,0 +1,421 @@
+"""
+Async data layer shared by every module that talks to Postgres.
+
+A single asyncpg pool is opened in the Application lifecycle (see `init_pool` /
+`close_pool`). All queries are module-level constants executed with positional
+parameters, so asyncpg prepares each one once per pooled connection and reuses
+the prepared statement from its statement cache afterwards.
+"""
+import os
+import logging
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL2")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+SUBSCRIBER_BATCH_SIZE = int(os.getenv("SUBSCRIBER_BATCH_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+async def init_pool(application=None, init=None):
+    """Open the shared connection pool. Usable as an Application post_init hook.
+    `init(connection)` runs on every new pooled connection (e.g. a query logger)."""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            init=init,
+        )
+        logger.info(f"DB pool ready ({DB_POOL_MIN_SIZE}-{DB_POOL_MAX_SIZE} connections)")
+    return _pool
+
+
+async def close_pool(application=None):
+    """Close the shared connection pool. Usable as an Application post_shutdown hook."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logger.info("DB pool closed")
+
+
+async def connect():
+    """A dedicated connection outside the pool, for session-scoped state such as advisory locks."""
+    return await asyncpg.connect(DATABASE_URL)
+
+
+def get_pool():
+    if _pool is None:
+        raise RuntimeError("DB pool is not initialised, call init_pool() first")
+    return _pool
+
+
+# --- Users ---
+UPSERT_USER = """
+    INSERT INTO users (user_id, username, first_name, last_name, name, gender, start_date, last_visited)
+    VALUES ($1, $2, $3, $4, $5, $6, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+        username = EXCLUDED.username,
+        first_name = EXCLUDED.first_name,
+        last_name = EXCLUDED.last_name,
+        name = COALESCE(EXCLUDED.name, users.name),
+        gender = COALESCE(EXCLUDED.gender, users.gender),
+        last_visited = CURRENT_TIMESTAMP
+"""
+
+SUBSCRIBE_USER = """
+    INSERT INTO users (user_id, username, first_name, last_name, start_date, last_visited, subscribed)
+    VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, TRUE)
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+        username = EXCLUDED.username,
+        first_name = EXCLUDED.first_name,
+        last_name = EXCLUDED.last_name,
+        last_visited = CURRENT_TIMESTAMP,
+        subscribed = TRUE
+    RETURNING delivery_timezone
+"""
+
+UNSUBSCRIBE_USER = "UPDATE users SET subscribed = FALSE WHERE user_id = $1"
+
+SELECT_USER_PROFILE = """
+    SELECT name, gender FROM users WHERE user_id = $1
+"""
+
+# Batched write-behind of user activity: one statement for many users
+TOUCH_USERS = """
+    INSERT INTO users (user_id, username, first_name, last_name, start_date, last_visited)
+    SELECT u.user_id, u.username, u.first_name, u.last_name, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+    FROM unnest($1::bigint[], $2::text[], $3::text[], $4::text[])
+        AS u(user_id, username, first_name, last_name)
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+        username = EXCLUDED.username,
+        first_name = EXCLUDED.first_name,
+        last_name = EXCLUDED.last_name,
+        last_visited = CURRENT_TIMESTAMP
+"""
+
+# Index-only scan on users_subscribed_timezone_idx (see migrations.py)
+SELECT_SUBSCRIBER_TIMEZONES = """
+    SELECT DISTINCT delivery_timezone FROM users WHERE subscribed
+"""
+
+# Index-only scan in user_id order; read through a server-side cursor
+SELECT_SUBSCRIBER_IDS = """
+    SELECT user_id FROM users WHERE subscribed AND delivery_timezone = $1 ORDER BY user_id
+"""
+
+async def upsert_user(user_id, username, first_name, last_name, name=None, gender=None):
+    await get_pool().execute(
+        UPSERT_USER, user_id, username, first_name, last_name, name, gender
+    )
+
+
+async def subscribe_user(user_id, username, first_name, last_name):
+    """Subscribe a user and return their delivery timezone."""
+    return await get_pool().fetchval(SUBSCRIBE_USER, user_id, username, first_name, last_name)
+
+
+async def unsubscribe_user(user_id):
+    await get_pool().execute(UNSUBSCRIBE_USER, user_id)
+
+
+async def get_user_profile(user_id):
+    """Return the user's name and gender, or None if unknown."""
+    return await get_pool().fetchrow(SELECT_USER_PROFILE, user_id)
+
+
+async def touch_users(users):
+    """Upsert identity fields and last_visited for many users. `users` is a list of
+    (user_id, username, first_name, last_name)."""
+    if users:
+        await get_pool().execute(TOUCH_USERS, *(list(column) for column in zip(*users)))
+
+
+async def get_subscriber_timezones():
+    """Return the set of timezones that have at least one subscriber."""
+    rows = await get_pool().fetch(SELECT_SUBSCRIBER_TIMEZONES)
+    return {row[0] for row in rows}
+
+
+async def iter_subscriber_batches(timezone, batch_size=SUBSCRIBER_BATCH_SIZE):
+    """Yield lists of at most `batch_size` subscriber ids for one timezone.
+
+    Rows come from a server-side cursor, so memory stays bounded by the batch
+    size however many subscribers the timezone has."""
+    async with get_pool().acquire() as connection:
+        async with connection.transaction(readonly=True):
+            cursor = await connection.cursor(SELECT_SUBSCRIBER_IDS, timezone)
+            while True:
+                rows = await cursor.fetch(batch_size)
+                if not rows:
+                    return
+                yield [row[0] for row in rows]
+
+
+# --- Card image file_id cache ---
+SELECT_CARD_FILE_ID = """
+    SELECT file_id FROM card_images WHERE image_path = $1 AND content_hash = $2
+"""
+
+UPSERT_CARD_FILE_ID = """
+    INSERT INTO card_images (image_path, content_hash, file_id, updated_at)
+    VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
+    ON CONFLICT (image_path, content_hash)
+    DO UPDATE SET
+        file_id = EXCLUDED.file_id,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+DELETE_CARD_FILE_ID = """
+    DELETE FROM card_images WHERE image_path = $1 AND content_hash = $2
+"""
+
+
+async def get_card_file_id(image_path, content_hash):
+    return await get_pool().fetchval(SELECT_CARD_FILE_ID, image_path, content_hash)
+
+
+async def save_card_file_id(image_path, content_hash, file_id):
+    await get_pool().execute(UPSERT_CARD_FILE_ID, image_path, content_hash, file_id)
+
+
+async def delete_card_file_id(image_path, content_hash):
+    await get_pool().execute(DELETE_CARD_FILE_ID, image_path, content_hash)
+
+
+# --- Pre-generated card interpretations ---
+COUNT_CARD_INTERPRETATIONS = """
+    SELECT card_name, count(*) AS variants
+    FROM card_interpretations WHERE generated_for = $1
+    GROUP BY card_name
+"""
+
+INSERT_CARD_INTERPRETATION = """
+    INSERT INTO card_interpretations (card_name, generated_for, variant, text)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (generated_for, card_name, variant) DO NOTHING
+"""
+
+SELECT_CARD_INTERPRETATIONS = """
+    SELECT card_name, text FROM card_interpretations WHERE generated_for = $1
+"""
+
+
+SELECT_LATEST_CARD_INTERPRETATION = """
+    SELECT text FROM card_interpretations WHERE card_name = $1
+    ORDER BY generated_for DESC, variant
+    LIMIT 1
+"""
+
+
+async def count_card_interpretations(day):
+    """Return dict: card_name -> number of stored variants for `day`."""
+    rows = await get_pool().fetch(COUNT_CARD_INTERPRETATIONS, day)
+    return {row["card_name"]: row["variants"] for row in rows}
+
+
+async def save_card_interpretation(card_name, day, variant, text):
+    await get_pool().execute(INSERT_CARD_INTERPRETATION, card_name, day, variant, text)
+
+
+async def get_latest_card_interpretation(card_name):
+    return await get_pool().fetchval(SELECT_LATEST_CARD_INTERPRETATION, card_name)
+
+
+async def get_card_interpretations(day):
+    """Return dict: card_name -> [texts] generated for `day`."""
+    pool = {}
+    for row in await get_pool().fetch(SELECT_CARD_INTERPRETATIONS, day):
+        pool.setdefault(row["card_name"], []).append(row["text"])
+    return pool
+
+
+# --- AI response cache ---
+SELECT_AI_CACHE = """
+    SELECT text FROM ai_cache WHERE cache_key = $1 AND expires_at > CURRENT_TIMESTAMP
+"""
+
+UPSERT_AI_CACHE = """
+    INSERT INTO ai_cache (cache_key, text, created_at, expires_at)
+    VALUES ($1, $2, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP + make_interval(secs => $3))
+    ON CONFLICT (cache_key)
+    DO UPDATE SET
+        text = EXCLUDED.text,
+        created_at = EXCLUDED.created_at,
+        expires_at = EXCLUDED.expires_at
+"""
+
+DELETE_EXPIRED_AI_CACHE = "DELETE FROM ai_cache WHERE expires_at <= CURRENT_TIMESTAMP"
+
+
+async def get_ai_cache(cache_key):
+    return await get_pool().fetchval(SELECT_AI_CACHE, cache_key)
+
+
+async def save_ai_cache(cache_key, text, ttl_seconds):
+    await get_pool().execute(UPSERT_AI_CACHE, cache_key, text, float(ttl_seconds))
+
+
+async def delete_expired_ai_cache():
+    return await get_pool().execute(DELETE_EXPIRED_AI_CACHE)
+
+
+# --- Daily delivery outbox ---
+ENQUEUE_DELIVERIES = """
+    INSERT INTO delivery_outbox (user_id, delivery_date, timezone, next_attempt_at)
+    SELECT u.user_id, $2, $3, u.send_at
+    FROM unnest($1::bigint[], $4::timestamptz[]) AS u(user_id, send_at)
+    ON CONFLICT (user_id, delivery_date) DO NOTHING
+"""
+
+# Pending rows that are due, plus rows whose claim outlived its lease (worker died mid-send).
+# SKIP LOCKED lets any number of worker processes claim disjoint batches concurrently.
+CLAIM_DELIVERIES = """
+    UPDATE delivery_outbox o
+    SET status = 'sending', claimed_at = now(), attempts = o.attempts + 1
+    FROM (
+        SELECT user_id, delivery_date FROM delivery_outbox
+        WHERE (status = 'pending' AND next_attempt_at <= now())
+           OR (status = 'sending' AND claimed_at < now() - make_interval(secs => $2))
+        ORDER BY next_attempt_at
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE o.user_id = due.user_id AND o.delivery_date = due.delivery_date
+    RETURNING o.user_id, o.delivery_date, o.timezone, o.attempts, o.claimed_at
+"""
+
+# Extend leases still held: a row re-claimed by another worker has a newer claimed_at
+RENEW_DELIVERY_LEASES = """
+    UPDATE delivery_outbox o
+    SET claimed_at = now()
+    FROM unnest($1::bigint[], $2::date[], $3::timestamptz[]) AS held(user_id, delivery_date, claimed_at)
+    WHERE o.user_id = held.user_id AND o.delivery_date = held.delivery_date
+      AND o.status = 'sending' AND o.claimed_at = held.claimed_at
+    RETURNING o.user_id, o.delivery_date, o.claimed_at
+"""
+
+MARK_DELIVERIES_SENT = """
+    UPDATE delivery_outbox o
+    SET status = 'sent', sent_at = now(), last_error = NULL
+    FROM unnest($1::bigint[], $2::date[]) AS done(user_id, delivery_date)
+    WHERE o.user_id = done.user_id AND o.delivery_date = done.delivery_date
+"""
+
+# Exponential backoff: $6 * 2^(attempts - 1) seconds capped at $5, dead after $4 attempts
+MARK_DELIVERIES_FAILED = """
+    UPDATE delivery_outbox o
+    SET status = CASE WHEN o.attempts >= $4 THEN 'dead' ELSE 'pending' END,
+        next_attempt_at = now() + make_interval(
+            secs => LEAST($6::float8 * power(2, o.attempts - 1), $5::float8)
+        ),
+        last_error = failed.error
+    FROM unnest($1::bigint[], $2::date[], $3::text[]) AS failed(user_id, delivery_date, error)
+    WHERE o.user_id = failed.user_id AND o.delivery_date = failed.delivery_date
+"""
+
+# Chats Telegram reports as gone (blocked, deactivated, deleted): dead-letter the
+# claimed rows, drop any other pending rows and unsubscribe the users, atomically.
+MARK_DELIVERIES_DEAD = """
+    UPDATE delivery_outbox o
+    SET status = 'dead', last_error = gone.error
+    FROM unnest($1::bigint[], $2::date[], $3::text[]) AS gone(user_id, delivery_date, error)
+    WHERE o.user_id = gone.user_id AND o.delivery_date = gone.delivery_date
+"""
+
+DROP_PENDING_DELIVERIES = """
+    DELETE FROM delivery_outbox WHERE user_id = ANY($1::bigint[]) AND status = 'pending'
+"""
+
+UNSUBSCRIBE_USERS = """
+    UPDATE users SET subscribed = FALSE WHERE user_id = ANY($1::bigint[]) AND subscribed
+"""
+
+
+async def enqueue_deliveries(timezone, day, plan, batch_size=SUBSCRIBER_BATCH_SIZE):
+    """Create one pending outbox row per subscriber of `timezone` for `day`. Returns rows added.
+    `plan(user_ids)` returns the instant each row becomes due.
+
+    Subscribers are streamed in batches and each batch commits on its own, so the
+    outbox worker can start sending the first batch while later ones are queued."""
+    queued = 0
+    async for user_ids in iter_subscriber_batches(timezone, batch_size):
+        result = await get_pool().execute(
+            ENQUEUE_DELIVERIES, user_ids, day, timezone, plan(user_ids)
+        )
+        queued += int(result.split()[-1])
+    return queued
+
+
+async def claim_deliveries(limit, lease_seconds):
+    return await get_pool().fetch(CLAIM_DELIVERIES, limit, float(lease_seconds))
+
+
+async def renew_delivery_leases(leases):
+    """`leases` maps (user_id, delivery_date) to the claimed_at of our claim. Returns the
+    same mapping, with renewed claimed_at, for the rows whose lease we still held."""
+    if not leases:
+        return {}
+    keys = list(leases)
+    rows = await get_pool().fetch(
+        RENEW_DELIVERY_LEASES,
+        [user_id for user_id, _ in keys],
+        [day for _, day in keys],
+        [leases[key] for key in keys],
+    )
+    return {(row["user_id"], row["delivery_date"]): row["claimed_at"] for row in rows}
+
+
+async def mark_deliveries_sent(rows):
+    if rows:
+        await get_pool().execute(
+            MARK_DELIVERIES_SENT,
+            [row["user_id"] for row in rows],
+            [row["delivery_date"] for row in rows],
+        )
+
+
+async def mark_deliveries_failed(failures, max_attempts, backoff_base, backoff_max):
+    """`failures` is a list of (row, error message)."""
+    if failures:
+        await get_pool().execute(
+            MARK_DELIVERIES_FAILED,
+            [row["user_id"] for row, _ in failures],
+            [row["delivery_date"] for row, _ in failures],
+            [error[:500] for _, error in failures],
+            max_attempts,
+            float(backoff_max),
+            float(backoff_base),
+        )
+
+
+async def prune_unreachable_chats(failures):
+    """`failures` is a list of (row, error message) for chats that can never be
+    delivered to. Returns the number of users unsubscribed."""
+    if not failures:
+        return 0
+    user_ids = [row["user_id"] for row, _ in failures]
+    async with get_pool().acquire() as connection:
+        async with connection.transaction():
+            await connection.execute(
+                MARK_DELIVERIES_DEAD,
+                user_ids,
+                [row["delivery_date"] for row, _ in failures],
+                [error[:500] for _, error in failures],
+            )
+            await connection.execute(DROP_PENDING_DELIVERIES, user_ids)
+            result = await connection.execute(UNSUBSCRIBE_USERS, user_ids)
+    return int(result.split()[-1])
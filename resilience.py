@@ -0,0 +1,70 @@
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast for
+    `reset_timeout` seconds; then lets one trial call through (half-open) and
+    closes again if it succeeds.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        """Raise CircuitOpenError if a call would be rejected right now. Lets callers
+        fail fast before queueing for a call they could not make anyway."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_running):
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        return state
+
+    async def call(self, fn):
+        """Await `fn()` through the breaker."""
+        state = self.check()
+        self._trial_running = state == "half_open"
+        try:
+            result = await fn()
+        except Exception:
+            self.record_failure()
+            raise
+        finally:
+            self._trial_running = False
+        self.record_success()
+        return result
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
@@ -0,0 +1,150 @@
+"""
+Delivery scheduler: a min-heap of the next due instant (UTC) for every timezone
+with subscribers. Instants are recomputed from the local wall-clock time for each
+local day, so they stay correct across DST switches and for offsets like +05:30.
+
+A slot that passed less than `grace` ago still fires, so a restart, a deploy or
+a leader handover just after 10:00 does not skip that timezone's day; enqueueing
+is idempotent. Older slots are dropped rather than delivered hours late.
+
+Each timezone's slot opens a delivery window; every subscriber gets a stable,
+hash-derived whole-minute offset inside it so sends spread evenly across the
+window instead of all landing on the first minute.
+"""
+import hashlib
+import heapq
+import logging
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+import pytz
+
+PREGEN = "pregen"
+DELIVER = "deliver"
+
+logger = logging.getLogger(__name__)
+
+DueEvent = namedtuple("DueEvent", "due kind timezone day")
+
+
+def local_instant(tz, day, local_time):
+    """UTC instant of `local_time` on local `day`, resolving DST gaps and overlaps."""
+    naive = datetime.combine(day, local_time)
+    try:
+        aware = tz.localize(naive, is_dst=None)
+    except pytz.AmbiguousTimeError:
+        aware = tz.localize(naive, is_dst=False)
+    except pytz.NonExistentTimeError:
+        # Clock jumped forward over the slot: deliver at the first valid minute after it
+        aware = tz.normalize(tz.localize(naive, is_dst=False))
+    return aware.astimezone(pytz.UTC)
+
+
+def delivery_offset(user_id, window):
+    """Stable whole-minute offset of a user inside a delivery window of `window`."""
+    minutes = int(window.total_seconds() // 60)
+    if minutes <= 1:
+        return timedelta(0)
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return timedelta(minutes=int.from_bytes(digest, "big") % minutes)
+
+
+class DeliveryScheduler:
+    def __init__(
+        self,
+        local_time=time(hour=10),
+        pregen_lead=timedelta(minutes=30),
+        window=timedelta(0),
+        grace=timedelta(hours=1),
+    ):
+        self.local_time = local_time
+        self.pregen_lead = pregen_lead
+        self.window = window
+        self.grace = grace
+        self._heap = []
+        # timezone -> generation; heap entries from an older generation are stale
+        self._timezones = {}
+        self._generation = 0
+
+    def __contains__(self, tz_name):
+        return tz_name in self._timezones
+
+    def __len__(self):
+        return len(self._timezones)
+
+    def _push(self, tz_name, day, generation):
+        tz = pytz.timezone(tz_name)
+        deliver_at = local_instant(tz, day, self.local_time)
+        heapq.heappush(self._heap, (deliver_at - self.pregen_lead, PREGEN, tz_name, day, generation))
+        heapq.heappush(self._heap, (deliver_at, DELIVER, tz_name, day, generation))
+
+    def add_timezone(self, tz_name, now=None):
+        """Start scheduling a timezone from its next local slot, or from today's if it
+        passed less than `grace` ago. O(log n); no-op if known."""
+        if tz_name in self._timezones:
+            return False
+        try:
+            tz = pytz.timezone(tz_name)
+        except pytz.UnknownTimeZoneError:
+            logger.warning(f"Unknown timezone {tz_name!r}, not scheduling it")
+            return False
+
+        now = now or datetime.now(pytz.UTC)
+        day = now.astimezone(tz).date()
+        if local_instant(tz, day, self.local_time) + self.grace <= now:
+            day += timedelta(days=1)
+
+        self._generation += 1
+        self._timezones[tz_name] = self._generation
+        self._push(tz_name, day, self._generation)
+        logger.info(
+            f"Scheduling {tz_name} at {local_instant(tz, day, self.local_time):%Y-%m-%d %H:%M} UTC "
+            f"({self.local_time:%H:%M} local, {self.window.total_seconds() / 60:.0f} min window)"
+        )
+        return True
+
+    def remove_timezone(self, tz_name):
+        """Stop scheduling a timezone. Its heap entries are dropped lazily when popped."""
+        self._timezones.pop(tz_name, None)
+
+    def next_due(self):
+        while self._heap and self._timezones.get(self._heap[0][2]) != self._heap[0][4]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """Return every DueEvent due at or before `now`, rescheduling each for the next local day.
+        Events more than `grace` late (e.g. a heap left alone while not the leader) are dropped."""
+        now = now or datetime.now(pytz.UTC)
+        events = []
+        while self._heap and self._heap[0][0] <= now:
+            due, kind, tz_name, day, generation = heapq.heappop(self._heap)
+            if self._timezones.get(tz_name) != generation:
+                continue
+            if kind == DELIVER:
+                self._push(tz_name, day + timedelta(days=1), generation)
+            if due + self.grace < now:
+                logger.warning(f"Dropping {kind} for {tz_name} on {day}: {now - due} late")
+                continue
+            events.append(DueEvent(due, kind, tz_name, day))
+        return events
+
+    def plan_sends(self, due, user_ids, buckets=None):
+        """Send instant of each user for a delivery window opening at `due`.
+        Per-minute counts are added to the `buckets` Counter when given."""
+        send_at = [due + delivery_offset(user_id, self.window) for user_id in user_ids]
+        if buckets is not None:
+            buckets.update(send_at)
+        return send_at
+
+
+def describe_plan(buckets):
+    """One-line summary of a per-minute send plan."""
+    if not buckets:
+        return "nothing planned"
+    total = sum(buckets.values())
+    peak_at, peak = max(buckets.items(), key=lambda item: item[1])
+    return (
+        f"{total} sends over {len(buckets)} minute buckets, "
+        f"peak {peak}/min at {peak_at:%H:%M} UTC, mean {total / len(buckets):.1f}/min"
+    )
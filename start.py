@@ -42,4 +42,4 @@ async def start(update: Update, context: CallbackContext) -> None:
     username = user.username
     first_name = user.first_name
     last_name = user.last_name
-    add_user_to_db(user_id, username, first_name, last_name)
+    await add_user_to_db(user_id, username, first_name, last_name)
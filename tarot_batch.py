@@ -0,0 +1,93 @@
+import os
+import json
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+from ai_client import generate_text
+from ai_scheduler import PREGEN
+from ai_prompt import generate_tarot_batch_prompt
+
+load_dotenv()
+BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "20"))
+BATCH_MAX_ATTEMPTS = int(os.getenv("GEMINI_BATCH_MAX_ATTEMPTS", "3"))
+BATCH_CONCURRENCY = int(os.getenv("GEMINI_BATCH_CONCURRENCY", "2"))
+# A 20-card JSON answer takes far longer than a single reading
+BATCH_DEADLINE_SECONDS = float(os.getenv("GEMINI_BATCH_DEADLINE_SECONDS", "120"))
+MAX_TEXT_LENGTH = 900  # leaves room for the card header inside Telegram's 1024-char caption
+
+logger = logging.getLogger(__name__)
+
+
+def parse_batch_response(raw, expected_ids):
+    """
+    Parse a batch answer into {id: text}, keeping only well-formed entries for
+    requested ids. Anything malformed is simply absent and will be retried.
+    """
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`")
+        raw = raw[raw.find("["):]
+    start, end = raw.find("["), raw.rfind("]")
+    if start == -1 or end == -1:
+        return {}
+    try:
+        items = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        entry_id, text = item.get("id"), item.get("text")
+        if isinstance(entry_id, str) and entry_id.isdigit():
+            entry_id = int(entry_id)
+        if entry_id not in expected_ids or entry_id in results:
+            continue
+        if not isinstance(text, str) or not text.strip() or len(text) > MAX_TEXT_LENGTH:
+            continue
+        results[entry_id] = text.strip()
+    return results
+
+
+async def _generate_chunk(entries):
+    prompt = generate_tarot_batch_prompt(entries)
+    try:
+        raw = await generate_text(
+            prompt, deadline=BATCH_DEADLINE_SECONDS, hedge=False, priority=PREGEN
+        )
+    except Exception as e:
+        logger.error(f"Batch generation error ({len(entries)} cards): {e}")
+        return {}
+    return parse_batch_response(raw, {entry_id for entry_id, _ in entries})
+
+
+async def generate_tarot_batch(card_names, batch_size=BATCH_SIZE, max_attempts=BATCH_MAX_ATTEMPTS):
+    """
+    Generate one interpretation per item of `card_names` (duplicates give distinct
+    variants) using as few Gemini requests as possible. Returns a list aligned with
+    `card_names`; entries still failing after `max_attempts` rounds are None.
+    """
+    pending = list(enumerate(card_names, start=1))
+    results = {}
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(chunk):
+        async with semaphore:
+            return await _generate_chunk(chunk)
+
+    for attempt in range(1, max_attempts + 1):
+        if not pending:
+            break
+        chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        for chunk_results in await asyncio.gather(*(run(chunk) for chunk in chunks)):
+            results.update(chunk_results)
+        pending = [entry for entry in pending if entry[0] not in results]
+        if pending:
+            logger.warning(
+                f"Batch attempt {attempt}: {len(pending)}/{len(card_names)} entries missing"
+            )
+
+    return [results.get(entry_id) for entry_id in range(1, len(card_names) + 1)]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The bot is a set of top-level modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
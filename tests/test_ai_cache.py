@@ -0,0 +1,54 @@
+import ai_cache
+from ai_cache import LRUCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1 and len(cache) == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ai_cache.time, "monotonic", clock)
+    cache = LRUCache(max_entries=10, ttl=60)
+    cache.set("default", 1)
+    cache.set("longer", 2, ttl=120)
+    clock.now += 60
+    assert cache.get("default") is None
+    assert cache.get("longer") == 2
+    clock.now += 60
+    assert cache.get("longer") is None
+    assert cache.expirations == 2 and len(cache) == 0
+
+
+def test_overwrite_refreshes_value_and_expiry(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ai_cache.time, "monotonic", clock)
+    cache = LRUCache(max_entries=10, ttl=60)
+    cache.set("a", 1)
+    clock.now += 50
+    cache.set("a", 2)
+    clock.now += 50
+    assert cache.get("a") == 2
+
+
+def test_make_key_depends_on_every_input():
+    key = ai_cache.make_key("tarot", 1, "model", card="Шут", name=None)
+    assert key == ai_cache.make_key("tarot", 1, "model", name=None, card="Шут")
+    assert key != ai_cache.make_key("tarot", 2, "model", card="Шут", name=None)
+    assert key != ai_cache.make_key("tarot", 1, "other", card="Шут", name=None)
+    assert key != ai_cache.make_key("tarot", 1, "model", card="Маг", name=None)
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from ai_scheduler import BROADCAST, INTERACTIVE, PREGEN, AIScheduler
+
+CAPS = {INTERACTIVE: 2, PREGEN: 1, BROADCAST: 1}
+
+
+async def hold(scheduler, priority, order, release):
+    async with scheduler.slot(priority):
+        order.append(priority)
+        await release.wait()
+
+
+def test_budget_is_granted_strictly_by_priority():
+    # 600/min: one token every 0.1 s once the burst is spent
+    scheduler = AIScheduler(600, CAPS)
+    order, release = [], asyncio.Event()
+
+    async def main():
+        scheduler.budget._tokens = 0
+        tasks = []
+        for priority in (BROADCAST, PREGEN, INTERACTIVE):
+            tasks.append(asyncio.ensure_future(hold(scheduler, priority, order, release)))
+            await asyncio.sleep(0)
+        while len(order) < 3:
+            await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == [INTERACTIVE, PREGEN, BROADCAST]
+
+
+def test_class_caps_do_not_block_other_classes():
+    scheduler = AIScheduler(60000, CAPS)
+    order, release = [], asyncio.Event()
+
+    async def main():
+        tasks = [asyncio.ensure_future(hold(scheduler, PREGEN, order, release)) for _ in range(3)]
+        tasks += [asyncio.ensure_future(hold(scheduler, INTERACTIVE, order, release)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        stats = scheduler.stats()
+        assert (stats[PREGEN]["active"], stats[PREGEN]["queued"]) == (1, 2)
+        assert (stats[INTERACTIVE]["active"], stats[INTERACTIVE]["queued"]) == (2, 1)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        stats = scheduler.stats()
+        assert stats[PREGEN]["granted"] == stats[INTERACTIVE]["granted"] == 3
+        assert stats[PREGEN]["active"] == stats[INTERACTIVE]["active"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_and_timed_out_waiters_free_their_place():
+    scheduler = AIScheduler(60000, CAPS)
+    order, release = [], asyncio.Event()
+
+    async def main():
+        holder = asyncio.ensure_future(hold(scheduler, BROADCAST, order, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(hold(scheduler, BROADCAST, order, release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.TimeoutError):
+            async with scheduler.slot(BROADCAST, timeout=0.01):
+                pass
+        assert scheduler.stats()[BROADCAST]["queued"] == 0
+
+        release.set()
+        await holder
+        async with scheduler.slot(BROADCAST, timeout=0.01):
+            assert scheduler.stats()[BROADCAST]["active"] == 1
+        assert scheduler.stats()[BROADCAST]["active"] == 0
+
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest
+
+import card_images
+
+
+class FakeBot:
+    def __init__(self, file_id_error=None):
+        self.file_id_error = file_id_error
+        self.sent = []
+
+    async def send_photo(self, chat_id, photo, caption):
+        self.sent.append(photo)
+        if isinstance(photo, str) and self.file_id_error:
+            raise BadRequest(self.file_id_error)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="fresh-id")])
+
+
+@pytest.fixture
+def cached_id(monkeypatch):
+    forgotten, saved = [], []
+    image = SimpleNamespace(data=b"jpeg", content_hash="abc")
+    monkeypatch.setattr(card_images.image_store, "get", lambda path: image)
+    monkeypatch.setattr(card_images, "_file_ids", {("images/fool.jpg", "abc"): "old-id"})
+
+    async def forget(*key):
+        forgotten.append(key)
+
+    async def save(*args):
+        saved.append(args)
+
+    monkeypatch.setattr(card_images, "delete_card_file_id", forget)
+    monkeypatch.setattr(card_images, "save_card_file_id", save)
+    return SimpleNamespace(forgotten=forgotten, saved=saved)
+
+
+def test_is_stale_file_id():
+    assert card_images.is_stale_file_id(BadRequest("Wrong file identifier/http url specified"))
+    assert card_images.is_stale_file_id(BadRequest("Wrong remote file identifier specified"))
+    assert card_images.is_stale_file_id(BadRequest("FILE_REFERENCE_EXPIRED"))
+    assert not card_images.is_stale_file_id(BadRequest("Chat not found"))
+    assert not card_images.is_stale_file_id(BadRequest("User is deactivated"))
+    assert not card_images.is_stale_file_id(BadRequest("Message caption is too long"))
+
+
+def test_stale_file_id_is_forgotten_and_reuploaded(cached_id):
+    bot = FakeBot("Wrong file identifier/http url specified")
+    asyncio.run(card_images.send_card_photo(bot, 1, "images/fool.jpg", "caption"))
+    assert bot.sent[0] == "old-id" and not isinstance(bot.sent[1], str)
+    assert cached_id.forgotten == [("images/fool.jpg", "abc")]
+    assert cached_id.saved == [("images/fool.jpg", "abc", "fresh-id")]
+
+
+def test_other_bad_request_keeps_the_shared_file_id(cached_id):
+    bot = FakeBot("Chat not found")
+    with pytest.raises(BadRequest):
+        asyncio.run(card_images.send_card_photo(bot, 1, "images/fool.jpg", "caption"))
+    assert bot.sent == ["old-id"]
+    assert cached_id.forgotten == []
+    assert card_images._file_ids[("images/fool.jpg", "abc")] == "old-id"
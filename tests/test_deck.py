@@ -0,0 +1,71 @@
+import random
+from datetime import date
+
+import pytest
+
+from deck import Card, Deck, build_deck
+
+
+def raw_card(stem, name=None, **overrides):
+    card = {
+        "name": name or stem.title(),
+        "category": "Старшие Арканы",
+        "meaning": "meaning",
+        "image_path": f"images/{stem}.jpg",
+    }
+    card.update(overrides)
+    return card
+
+
+@pytest.fixture
+def base_dir(tmp_path):
+    (tmp_path / "images").mkdir()
+    for stem in ("fool", "magician", "priestess"):
+        (tmp_path / "images" / f"{stem}.jpg").write_bytes(b"jpeg")
+    return tmp_path
+
+
+def test_build_deck_skips_invalid_cards(base_dir):
+    deck = build_deck([
+        raw_card("fool"),
+        raw_card("magician", meaning=""),
+        raw_card("empress"),
+        raw_card("fool", name="Another Fool"),
+        raw_card("priestess", name="Fool"),
+        raw_card("priestess", category="Младшие Арканы"),
+    ], base_dir)
+    assert [card.id for card in deck] == ["fool", "priestess"]
+    assert deck.by_id("priestess").suit == "Младшие Арканы"
+    assert deck.by_name("Fool").id == "fool"
+    assert deck.by_id("empress") is None
+
+
+def test_build_deck_without_valid_cards_fails(base_dir):
+    with pytest.raises(ValueError):
+        build_deck([raw_card("empress")], base_dir)
+
+
+def test_deck_is_immutable(base_dir):
+    deck = build_deck([raw_card("fool"), raw_card("magician")], base_dir)
+    with pytest.raises(TypeError):
+        deck._by_id["x"] = None
+    with pytest.raises(AttributeError):
+        deck.cards[0].name = "changed"
+
+
+def test_draws_do_not_mutate_and_are_stable(base_dir):
+    deck = build_deck([raw_card("fool"), raw_card("magician"), raw_card("priestess")], base_dir)
+    before = deck.cards
+    drawn = {deck.draw(random.Random(seed)).id for seed in range(50)}
+    assert drawn == {"fool", "magician", "priestess"}
+    assert deck.cards is before and len(deck) == 3
+    assert deck.draw_for_user(42, date(2024, 6, 1)) == deck.draw_for_user(42, date(2024, 6, 1))
+    assert deck.draw_seeded("a", 1) == deck.draw_seeded("a", 1)
+
+
+def test_suits_group_cards():
+    cards = [Card("a", "A", "Кубки", "", ""), Card("b", "B", "Мечи", "", ""), Card("c", "C", "Кубки", "", "")]
+    deck = Deck(cards)
+    assert deck.suits == ("Кубки", "Мечи")
+    assert [card.id for card in deck.by_suit("Кубки")] == ["a", "c"]
+    assert deck.by_suit("Жезлы") == ()
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from hedging import HedgeStats, LatencyTracker, hedged
+
+
+def call(result, delay, log=None, name=None):
+    async def run():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"{name} cancelled")
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return run
+
+
+def test_fast_primary_never_starts_backup():
+    stats = HedgeStats()
+    backup_started = []
+
+    async def backup():
+        backup_started.append(1)
+        return "backup"
+
+    assert asyncio.run(hedged(call("primary", 0), backup, 0.5, stats)) == "primary"
+    assert backup_started == []
+    assert (stats.requests, stats.hedged, stats.primary_wins) == (1, 0, 1)
+
+
+def test_backup_wins_after_threshold_and_primary_is_cancelled():
+    stats, log = HedgeStats(), []
+    result = asyncio.run(
+        hedged(call("primary", 5, log, "primary"), call("backup", 0.01), 0.01, stats)
+    )
+    assert result == "backup"
+    assert log == ["primary cancelled"]
+    assert (stats.hedged, stats.backup_wins, stats.primary_wins) == (1, 1, 0)
+    assert stats.hedge_rate == 1.0
+
+
+def test_failed_backup_falls_back_to_slow_primary():
+    stats = HedgeStats()
+    result = asyncio.run(
+        hedged(call("primary", 0.05), call(RuntimeError("backup down"), 0), 0.01, stats)
+    )
+    assert result == "primary"
+    assert (stats.hedged, stats.primary_wins) == (1, 1)
+
+
+def test_both_failing_raises_the_first_error():
+    with pytest.raises(RuntimeError, match="backup down"):
+        asyncio.run(hedged(
+            call(RuntimeError("primary down"), 0.05), call(RuntimeError("backup down"), 0),
+            0.01, HedgeStats(),
+        ))
+
+
+def test_cancelling_the_hedge_cancels_both_calls():
+    log = []
+
+    async def main():
+        task = asyncio.ensure_future(hedged(
+            call("primary", 5, log, "primary"), call("backup", 5, log, "backup"), 0.01, HedgeStats()
+        ))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert sorted(log) == ["backup cancelled", "primary cancelled"]
+
+
+def test_latency_tracker_percentiles_over_a_sliding_window():
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(95) is None
+    for ms in range(1, 201):
+        tracker.record(ms / 1000)
+    assert len(tracker) == 100
+    assert tracker.percentile(0) == 0.101
+    assert tracker.percentile(50) == 0.151
+    assert tracker.percentile(100) == 0.2
@@ -0,0 +1,57 @@
+import asyncio
+
+import horoscope
+from ai_scheduler import INTERACTIVE, PREGEN
+
+
+def test_interactive_caller_does_not_wait_behind_prewarm(monkeypatch):
+    monkeypatch.setattr(horoscope, "_horoscopes", {})
+    monkeypatch.setattr(horoscope, "_in_flight", {})
+    started, release = [], {}
+
+    async def generate(day, sign, priority):
+        started.append(priority)
+        release[priority] = asyncio.Event()
+        await release[priority].wait()
+        return f"{priority} text"
+
+    monkeypatch.setattr(horoscope, "_generate_horoscope", generate)
+
+    async def main():
+        prewarm = asyncio.ensure_future(horoscope.get_horoscope("Овен", PREGEN))
+        await asyncio.sleep(0.01)
+        clicks = [asyncio.ensure_future(horoscope.get_horoscope("Овен")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        # One interactive generation of its own, shared by both clicks
+        assert started == [PREGEN, INTERACTIVE]
+
+        release[INTERACTIVE].set()
+        assert await asyncio.gather(*clicks) == ["interactive text"] * 2
+        assert not prewarm.done()
+
+        release[PREGEN].set()
+        assert await prewarm == "pregen text"
+        assert horoscope._in_flight == {}
+
+    asyncio.run(main())
+
+
+def test_prewarm_joins_interactive_generation(monkeypatch):
+    monkeypatch.setattr(horoscope, "_horoscopes", {})
+    monkeypatch.setattr(horoscope, "_in_flight", {})
+    started = []
+
+    async def generate(day, sign, priority):
+        started.append(priority)
+        await asyncio.sleep(0.01)
+        return "text"
+
+    monkeypatch.setattr(horoscope, "_generate_horoscope", generate)
+
+    async def main():
+        return await asyncio.gather(
+            horoscope.get_horoscope("Лев"), horoscope.get_horoscope("Лев", PREGEN)
+        )
+
+    assert asyncio.run(main()) == ["text", "text"]
+    assert started == [INTERACTIVE]
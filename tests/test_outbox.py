@@ -0,0 +1,125 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+import outbox
+
+DAY = date(2024, 6, 1)
+
+
+class FakeRepository:
+    def __init__(self, user_ids, lose_on_renewal=()):
+        self.rows = [
+            {"user_id": user_id, "delivery_date": DAY, "timezone": "Europe/London",
+             "attempts": 1, "claimed_at": datetime(2024, 6, 1, 9, tzinfo=timezone.utc)}
+            for user_id in user_ids
+        ]
+        self.lose_on_renewal = set(lose_on_renewal)
+        self.renewals = []
+        self.sent = []
+        self.failed = []
+        self.pruned = []
+
+    async def claim_deliveries(self, limit, lease_seconds):
+        rows, self.rows = self.rows[:limit], self.rows[limit:]
+        return rows
+
+    async def renew_delivery_leases(self, leases):
+        self.renewals.append(sorted(user_id for user_id, _ in leases))
+        return {key: claimed_at for key, claimed_at in leases.items() if key[0] not in self.lose_on_renewal}
+
+    async def mark_deliveries_sent(self, rows):
+        self.sent.extend(row["user_id"] for row in rows)
+
+    async def mark_deliveries_failed(self, failures, *args):
+        self.failed.extend(row["user_id"] for row, _ in failures)
+
+    async def prune_unreachable_chats(self, gone):
+        self.pruned.extend(row["user_id"] for row, _ in gone)
+        return len(gone)
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    def install(*args, **kwargs):
+        fake = FakeRepository(*args, **kwargs)
+        for name in ("claim_deliveries", "renew_delivery_leases", "mark_deliveries_sent", "mark_deliveries_failed",
+                     "prune_unreachable_chats"):
+            monkeypatch.setattr(outbox.repository, name, getattr(fake, name))
+        return fake
+    return install
+
+
+def test_batch_is_sent_row_by_row_and_settled(repository):
+    fake = repository([1, 2, 3, 4])
+
+    async def send(user_id, day):
+        if user_id == 2:
+            raise RuntimeError("boom")
+        return user_id != 3
+
+    assert asyncio.run(outbox.process_batch(send, limit=10)) == 4
+    assert fake.sent == [1, 4]
+    assert fake.failed == [2, 3]
+    assert fake.renewals == []
+
+
+def test_lease_is_renewed_and_lost_rows_are_skipped(repository, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_LEASE_SECONDS", 0.2)
+    fake = repository([1, 2, 3], lose_on_renewal={3})
+    calls = []
+
+    async def send(user_id, day):
+        calls.append(user_id)
+        await asyncio.sleep(0.06)
+
+    asyncio.run(outbox.process_batch(send, limit=10))
+    # Row 3 was re-claimed by another worker while rows 1 and 2 were sending
+    assert calls == [1, 2]
+    assert fake.renewals and fake.renewals[0] == [2, 3]
+    assert fake.sent == [1, 2]
+
+
+def test_cancelled_batch_records_finished_sends(repository):
+    fake = repository(range(10))
+
+    async def send(user_id, day):
+        await asyncio.sleep(0.01 if user_id < 3 else 10)
+
+    async def main():
+        task = asyncio.create_task(outbox.process_batch(send, limit=10))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert fake.sent == [0, 1, 2]
+
+
+def test_gone_chats_are_pruned_not_retried(repository):
+    fake = repository([1, 2, 3])
+
+    async def send(user_id, day):
+        if user_id == 1:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if user_id == 2:
+            raise BadRequest("Message caption is too long")
+        return True
+
+    asyncio.run(outbox.process_batch(send, limit=10))
+    assert (fake.sent, fake.failed, fake.pruned) == ([3], [2], [1])
+
+
+def test_is_chat_gone():
+    assert outbox.is_chat_gone(Forbidden("Forbidden: bot was blocked by the user"))
+    assert outbox.is_chat_gone(BadRequest("Chat not found"))
+    assert outbox.is_chat_gone(BadRequest("Bad Request: user is deactivated"))
+    assert outbox.is_chat_gone(BadRequest("PEER_ID_INVALID"))
+    assert not outbox.is_chat_gone(BadRequest("Wrong file identifier/http url specified"))
+    assert not outbox.is_chat_gone(BadRequest("Message caption is too long"))
+    assert not outbox.is_chat_gone(RetryAfter(5))
+    assert not outbox.is_chat_gone(NetworkError("Chat not found"))
+    assert not outbox.is_chat_gone(RuntimeError("chat not found"))
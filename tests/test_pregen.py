@@ -0,0 +1,41 @@
+import asyncio
+from datetime import date
+
+import pregen
+from deck import deck
+
+DAY = date(2024, 6, 1)
+
+
+def test_incomplete_pool_is_reloaded_complete_pool_is_kept(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(pregen.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(pregen, "_pools", {})
+    monkeypatch.setattr(pregen, "_reload_at", {})
+    stored = {deck.cards[0].name: ["text"]}
+    loads = []
+
+    async def get_card_interpretations(day):
+        loads.append(day)
+        return dict(stored)
+
+    monkeypatch.setattr(pregen.repository, "get_card_interpretations", get_card_interpretations)
+
+    async def main():
+        pool = await pregen.get_interpretation_pool(DAY)
+        assert pregen.draw_interpretation(pool, deck.cards[1].name) is None
+        await pregen.get_interpretation_pool(DAY)
+        assert len(loads) == 1
+
+        # Pre-generation finished in another process
+        stored.update({card.name: ["text"] for card in deck})
+        clock[0] += pregen.PREGEN_POOL_RELOAD_SECONDS
+        pool = await pregen.get_interpretation_pool(DAY)
+        assert pregen.draw_interpretation(pool, deck.cards[1].name) == "text"
+        assert len(loads) == 2
+
+        clock[0] += 24 * 3600
+        await pregen.get_interpretation_pool(DAY)
+        assert len(loads) == 2
+
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+
+import rate_limit
+from rate_limit import AdaptiveRateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda low, high: 0.0)
+    return now
+
+
+def request(limiter, callback, chat_id=42, endpoint="sendMessage"):
+    return limiter.process_request(callback, (), {}, endpoint, {"chat_id": chat_id}, None)
+
+
+async def ok():
+    return "ok"
+
+
+def test_token_bucket_bursts_refills_and_keeps_tokens_on_rate_change(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.time_until_available() == 0.5
+
+    clock[0] += 0.5
+    assert bucket.try_acquire()
+    bucket.set_rate(10)
+    assert bucket.capacity == 10
+    assert bucket.time_until_available() == 0.1
+
+
+def test_rate_grows_additively_once_per_interval_up_to_max(clock):
+    limiter = AdaptiveRateLimiter(rate=10, max_rate=12, per_chat_rate=1000, adjust_interval=5)
+
+    async def main():
+        for _ in range(4):
+            await request(limiter, ok)
+        assert limiter.rate == 10
+        for _ in range(3):
+            clock[0] += 5
+            assert await request(limiter, ok) == "ok"
+
+    asyncio.run(main())
+    assert limiter.rate == 12
+    assert limiter.counters["increases"] == 2
+
+
+def test_retry_after_halves_rate_once_per_interval_and_cools_the_chat(clock):
+    limiter = AdaptiveRateLimiter(rate=20, min_rate=4, per_chat_rate=1000, adjust_interval=5)
+    attempts = []
+
+    async def flooded():
+        attempts.append(1)
+        if len(attempts) <= 2:
+            raise RetryAfter(0)
+        return "ok"
+
+    async def main():
+        assert await request(limiter, flooded) == "ok"
+
+    asyncio.run(main())
+    # Two 429s in one interval are one congestion event
+    assert len(attempts) == 3
+    assert limiter.rate == 10
+    assert limiter.counters["retry_after"] == 2
+    assert limiter.counters["decreases"] == 1
+    assert limiter.counters["retries"] == 2
+
+    limiter._on_retry_after("sendMessage", 7, 30)
+    assert limiter.rate == 10
+    clock[0] += 5
+    limiter._on_retry_after("sendMessage", 7, 30)
+    limiter._on_retry_after("sendMessage", 8, 30)
+    assert limiter.rate == 5
+    assert limiter._cooldowns[7] == clock[0] + 30
+    clock[0] += 5
+    limiter._on_retry_after("sendMessage", None, 30)
+    assert limiter.rate == 4
+    assert limiter._paused_until == clock[0] + 30
+
+
+def test_long_retry_after_is_raised_to_the_caller(clock):
+    limiter = AdaptiveRateLimiter(per_chat_rate=1000, max_retry_after=60)
+
+    async def flooded():
+        raise RetryAfter(120)
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(request(limiter, flooded))
+    assert limiter.counters["retries"] == 0
+
+
+def test_latency_spike_backs_off_gently(clock):
+    limiter = AdaptiveRateLimiter(rate=20, per_chat_rate=1000, adjust_interval=5, latency_factor=3)
+    limiter._on_success("sendPhoto", 0.1)
+    for _ in range(10):
+        limiter._on_success("sendPhoto", 2.0)
+    clock[0] += 5
+    limiter._on_success("sendPhoto", 2.0)
+    assert limiter.rate == 17
+    assert limiter.counters["decreases"] == 1
+
+
+def test_cooldown_holds_only_that_chat():
+    limiter = AdaptiveRateLimiter(per_chat_rate=1000)
+    limiter._on_retry_after("sendMessage", 7, 0.2)
+    finished = []
+
+    async def send(chat_id):
+        await request(limiter, ok, chat_id=chat_id)
+        finished.append(chat_id)
+
+    async def main():
+        await asyncio.gather(send(7), send(8))
+
+    asyncio.run(main())
+    assert finished == [8, 7]
+    assert 7 not in limiter._cooldowns
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+import ai_client
+import resilience
+from ai_scheduler import BROADCAST, INTERACTIVE, PREGEN, AIScheduler
+from resilience import CircuitBreaker, CircuitOpenError
+
+
+async def ok():
+    return "ok"
+
+
+async def fail():
+    raise RuntimeError("boom")
+
+
+def test_breaker_opens_after_threshold_and_fails_fast(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        assert breaker.state == "closed"
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        assert breaker.state == "open"
+
+        calls = []
+
+        async def tracked():
+            calls.append(1)
+            return "ok"
+
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(tracked)
+        assert calls == [] and breaker.rejected == 1
+
+    asyncio.run(main())
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        clock[0] += 10
+        assert breaker.state == "half_open"
+
+        release = asyncio.Event()
+
+        async def trial():
+            await release.wait()
+            return "ok"
+
+        first = asyncio.ensure_future(breaker.call(trial))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(ok)
+        release.set()
+        assert await first == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(main())
+
+
+def test_failed_trial_reopens(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=10)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        clock[0] += 10
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        assert breaker.state == "open"
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def saturated_scheduler(monkeypatch):
+    """An AI scheduler that never grants a slot, e.g. behind a long queue."""
+    scheduler = AIScheduler(6000, {INTERACTIVE: 0, PREGEN: 0, BROADCAST: 0})
+    monkeypatch.setattr(ai_client, "ai_scheduler", scheduler)
+    monkeypatch.setattr(ai_client, "breakers", {})
+    return scheduler
+
+
+def test_open_circuit_rejects_before_queueing(saturated_scheduler):
+    breaker = ai_client.get_breaker("model")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    async def main():
+        with pytest.raises(CircuitOpenError):
+            await asyncio.wait_for(ai_client.generate_text("prompt", "model"), 1)
+        with pytest.raises(CircuitOpenError):
+            await asyncio.wait_for(ai_client.stream_text("prompt", "model").__anext__(), 1)
+
+    asyncio.run(main())
+    assert saturated_scheduler.stats()[INTERACTIVE]["queued"] == 0
+
+
+def test_interactive_deadline_includes_queue_wait(saturated_scheduler):
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(asyncio.TimeoutError):
+            await ai_client.generate_text("prompt", "model", deadline=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await ai_client.stream_text("prompt", "model", deadline=0.05).__anext__()
+        assert loop.time() - started < 1
+        # Waiting for a slot says nothing about the model's health
+        assert ai_client.get_breaker("model").failures == 0
+
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+import pytz
+
+from scheduler import DELIVER, PREGEN, DeliveryScheduler, delivery_offset, local_instant
+
+LONDON = pytz.timezone("Europe/London")
+KOLKATA = pytz.timezone("Asia/Kolkata")
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=pytz.UTC)
+
+
+def test_local_instant_follows_dst():
+    # 10:00 London is 10:00 UTC in winter and 09:00 UTC once BST starts
+    assert local_instant(LONDON, date(2024, 3, 30), time(10)) == utc(2024, 3, 30, 10)
+    assert local_instant(LONDON, date(2024, 3, 31), time(10)) == utc(2024, 3, 31, 9)
+    assert local_instant(LONDON, date(2024, 10, 27), time(10)) == utc(2024, 10, 27, 10)
+
+
+def test_local_instant_spring_forward_gap():
+    # 01:30 does not exist on 2024-03-31 in London: delivered at the first valid local minute after it
+    instant = local_instant(LONDON, date(2024, 3, 31), time(1, 30))
+    assert instant == utc(2024, 3, 31, 1, 30)
+    assert instant.astimezone(LONDON).strftime("%H:%M") == "02:30"
+
+
+def test_local_instant_fall_back_overlap():
+    # 01:30 happens twice on 2024-10-27 in London: the later (GMT) one is used
+    assert local_instant(LONDON, date(2024, 10, 27), time(1, 30)) == utc(2024, 10, 27, 1, 30)
+
+
+def test_local_instant_half_hour_offset():
+    assert local_instant(KOLKATA, date(2024, 6, 1), time(10)) == utc(2024, 6, 1, 4, 30)
+
+
+def test_add_timezone_schedules_next_local_slot():
+    scheduler = DeliveryScheduler(local_time=time(10), pregen_lead=timedelta(minutes=30))
+    assert scheduler.add_timezone("Asia/Kolkata", now=utc(2024, 6, 1, 6))
+    assert not scheduler.add_timezone("Asia/Kolkata", now=utc(2024, 6, 1, 6))
+    assert not scheduler.add_timezone("Mars/Olympus_Mons")
+    # 10:00 IST (04:30 UTC) passed more than the one hour grace ago: first slot is tomorrow's
+    assert scheduler.next_due() == utc(2024, 6, 2, 4)
+
+
+def test_add_timezone_catches_up_a_recently_missed_slot():
+    # e.g. a deploy at 10:20 local: today's pre-generation and delivery still fire
+    scheduler = DeliveryScheduler(
+        local_time=time(10), pregen_lead=timedelta(minutes=30), grace=timedelta(hours=1)
+    )
+    scheduler.add_timezone("Asia/Kolkata", now=utc(2024, 6, 1, 4, 50))
+    events = scheduler.pop_due(now=utc(2024, 6, 1, 4, 50))
+    assert [(event.kind, event.day) for event in events] == [
+        (PREGEN, date(2024, 6, 1)), (DELIVER, date(2024, 6, 1))
+    ]
+    assert scheduler.next_due() == utc(2024, 6, 2, 4)
+
+
+def test_pop_due_reschedules_across_dst():
+    scheduler = DeliveryScheduler(local_time=time(10), pregen_lead=timedelta(minutes=30))
+    scheduler.add_timezone("Europe/London", now=utc(2024, 3, 30, 12))
+
+    assert scheduler.pop_due(now=utc(2024, 3, 31, 8, 59)) == [
+        (utc(2024, 3, 31, 8, 30), PREGEN, "Europe/London", date(2024, 3, 31))
+    ]
+    events = scheduler.pop_due(now=utc(2024, 3, 31, 9))
+    assert [(event.kind, event.day) for event in events] == [(DELIVER, date(2024, 3, 31))]
+    assert scheduler.pop_due(now=utc(2024, 3, 31, 9)) == []
+    assert scheduler.next_due() == utc(2024, 4, 1, 8, 30)
+
+
+def test_pop_due_minute_precise_for_half_hour_offset():
+    scheduler = DeliveryScheduler(local_time=time(10), pregen_lead=timedelta(0))
+    scheduler.add_timezone("Asia/Kolkata", now=utc(2024, 6, 1))
+    assert scheduler.pop_due(now=utc(2024, 6, 1, 4, 29, 59)) == []
+    assert [event.due for event in scheduler.pop_due(now=utc(2024, 6, 1, 4, 30))] == [
+        utc(2024, 6, 1, 4, 30), utc(2024, 6, 1, 4, 30)
+    ]
+
+
+def test_late_pop_fires_within_grace_and_drops_older_events():
+    scheduler = DeliveryScheduler(
+        local_time=time(10), pregen_lead=timedelta(minutes=30), grace=timedelta(hours=1)
+    )
+    scheduler.add_timezone("Europe/London", now=utc(2024, 6, 1))
+    # A follower elected at 09:45 UTC: the 09:00 delivery is 45 min late, pre-generation 75 min
+    events = scheduler.pop_due(now=utc(2024, 6, 1, 9, 45))
+    assert [(event.kind, event.day) for event in events] == [(DELIVER, date(2024, 6, 1))]
+
+    # Elected days later: everything missed is dropped, the schedule carries on
+    assert scheduler.pop_due(now=utc(2024, 6, 4, 12)) == []
+    assert scheduler.next_due() == utc(2024, 6, 5, 8, 30)
+
+
+def test_removed_timezone_can_be_added_again():
+    scheduler = DeliveryScheduler(local_time=time(10), pregen_lead=timedelta(minutes=30))
+    now = utc(2024, 6, 1)
+    scheduler.add_timezone("Europe/London", now=now)
+    scheduler.remove_timezone("Europe/London")
+    assert "Europe/London" not in scheduler
+    assert scheduler.next_due() is None
+
+    scheduler.add_timezone("Europe/London", now=now)
+    scheduler.remove_timezone("Europe/London")
+    assert scheduler.add_timezone("Europe/London", now=now)
+    assert len(scheduler) == 1
+
+    # Entries from the earlier registrations are stale and never fire
+    events = scheduler.pop_due(now=utc(2024, 6, 1, 9))
+    assert [event.kind for event in events] == [PREGEN, DELIVER]
+
+
+def test_delivery_offset_is_stable_whole_minutes_inside_window():
+    window = timedelta(minutes=30)
+    offsets = [delivery_offset(user_id, window) for user_id in range(10_000)]
+    assert offsets == [delivery_offset(user_id, window) for user_id in range(10_000)]
+    assert all(timedelta(0) <= offset < window and offset.seconds % 60 == 0 for offset in offsets)
+    assert len(set(offsets)) == 30
+
+
+def test_delivery_offset_without_window():
+    assert delivery_offset(12345, timedelta(0)) == timedelta(0)
+    assert delivery_offset(12345, timedelta(minutes=1)) == timedelta(0)
+
+
+def test_plan_sends_counts_minute_buckets():
+    scheduler = DeliveryScheduler(window=timedelta(minutes=10))
+    due = utc(2024, 6, 1, 9)
+    buckets = Counter()
+    send_at = scheduler.plan_sends(due, range(1000), buckets)
+    assert len(send_at) == 1000
+    assert sum(buckets.values()) == 1000
+    assert set(buckets) <= {due + timedelta(minutes=minute) for minute in range(10)}
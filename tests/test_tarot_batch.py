@@ -0,0 +1,39 @@
+import json
+
+from tarot_batch import MAX_TEXT_LENGTH, parse_batch_response
+
+
+def test_parses_well_formed_answer():
+    raw = json.dumps([{"id": 1, "text": " Шут "}, {"id": 2, "text": "Маг"}], ensure_ascii=False)
+    assert parse_batch_response(raw, {1, 2}) == {1: "Шут", 2: "Маг"}
+
+
+def test_accepts_code_fence_and_surrounding_text():
+    raw = 'Here you go:\n```json\n[{"id": "3", "text": "Жрица"}]\n```'
+    assert parse_batch_response(raw, {3}) == {3: "Жрица"}
+
+
+def test_malformed_json_gives_nothing():
+    assert parse_batch_response('[{"id": 1, "text": "Шут"', {1}) == {}
+    assert parse_batch_response("[{'id': 1, 'text': 'Шут'}]", {1}) == {}
+    assert parse_batch_response("no json at all", {1}) == {}
+    assert parse_batch_response("", {1}) == {}
+
+
+def test_non_list_answer_gives_nothing():
+    assert parse_batch_response('[1, 2] and {"id": 1}', {1}) == {}
+    assert parse_batch_response('{"id": 1, "text": "[Шут]"}', {1}) == {}
+
+
+def test_drops_bad_entries_and_keeps_the_rest():
+    raw = json.dumps([
+        {"id": 1, "text": "Шут"},
+        {"id": 1, "text": "duplicate"},
+        {"id": 9, "text": "not requested"},
+        {"id": 2, "text": "   "},
+        {"id": 3, "text": "x" * (MAX_TEXT_LENGTH + 1)},
+        {"id": 4},
+        "junk",
+        {"id": 5, "text": 42},
+    ])
+    assert parse_batch_response(raw, {1, 2, 3, 4, 5}) == {1: "Шут"}
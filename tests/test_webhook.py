@@ -0,0 +1,26 @@
+import asyncio
+from types import SimpleNamespace
+
+from webhook import SECRET_HEADER, WebhookServer
+
+
+class FakeRequest:
+    def __init__(self, token):
+        self.headers = {SECRET_HEADER: token}
+
+    async def json(self):
+        return {"update_id": 1}
+
+
+def handle(server, token):
+    return asyncio.run(server.handle_update(FakeRequest(token))).status
+
+
+def test_secret_token_check_rejects_any_header_value_with_403():
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+    server = WebhookServer(application, "s3cret")
+    assert handle(server, "wrong") == 403
+    assert handle(server, "сек-рет") == 403
+    assert handle(server, "s3cr\udcff") == 403
+    assert server.rejected == 3
+    assert application.update_queue.empty()
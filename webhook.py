@@ -0,0 +1,138 @@
+"""
+Webhook serving mode: an embedded aiohttp server that receives Telegram updates
+and feeds them into the same Application (and handlers) as polling mode.
+
+    python webhook.py
+
+needs WEBHOOK_URL (public base URL) and WEBHOOK_SECRET_TOKEN; the server listens
+on PORT (default 8443). GET /healthz reports readiness and queue depth.
+"""
+import os
+import hmac
+import signal
+import asyncio
+import logging
+
+from aiohttp import web
+from dotenv import load_dotenv
+from telegram import Update
+
+load_dotenv()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8443"))
+WEBHOOK_DRAIN_SECONDS = float(os.getenv("WEBHOOK_DRAIN_SECONDS", "20"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    def __init__(self, application, secret_token, path=WEBHOOK_PATH):
+        self.application = application
+        self.secret_token = secret_token
+        self.path = path
+        self.draining = False
+        self.received = 0
+        self.rejected = 0
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle_update)
+        self.app.router.add_get("/healthz", self.handle_health)
+
+    async def handle_update(self, request):
+        if self.draining:
+            # Telegram retries non-2xx deliveries, so nothing is lost while we shut down
+            return web.Response(status=503, text="draining")
+        # compare_digest only takes ASCII str; any header value encodes to bytes
+        # (aiohttp decodes undecodable bytes as surrogates)
+        token = request.headers.get(SECRET_HEADER, "").encode("utf-8", "surrogateescape")
+        if not self.secret_token or not hmac.compare_digest(token, self.secret_token.encode()):
+            self.rejected += 1
+            return web.Response(status=403, text="forbidden")
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="invalid json")
+
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
+        self.received += 1
+        return web.Response(text="ok")
+
+    async def handle_health(self, request):
+        status = 503 if self.draining or not self.application.running else 200
+        return web.json_response(
+            {
+                "status": "draining" if self.draining else ("ok" if status == 200 else "starting"),
+                "pending_updates": self.application.update_queue.qsize(),
+                "received": self.received,
+                "rejected": self.rejected,
+            },
+            status=status,
+        )
+
+    async def start(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Webhook server listening on {host}:{port}{self.path}")
+
+    async def drain(self, timeout=WEBHOOK_DRAIN_SECONDS):
+        """Stop accepting updates and wait until the queued ones have been handed to handlers."""
+        self.draining = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.application.update_queue.qsize() and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        left = self.application.update_queue.qsize()
+        if left:
+            logger.warning(f"Webhook drain timed out with {left} updates queued")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def run():
+    from bot import build_application, post_init, post_shutdown
+
+    if not WEBHOOK_URL or not WEBHOOK_SECRET_TOKEN:
+        raise EnvironmentError("WEBHOOK_URL and WEBHOOK_SECRET_TOKEN are required in webhook mode")
+
+    application = build_application()
+    server = WebhookServer(application, WEBHOOK_SECRET_TOKEN)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    await post_init(application)
+    await application.start()
+    await server.start()
+    await application.bot.set_webhook(
+        url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    logger.info("Bot started in webhook mode ✅✨")
+    try:
+        await stop.wait()
+    finally:
+        await server.drain()
+        # Application.stop() lets handlers already running finish
+        await application.stop()
+        await server.stop()
+        await post_shutdown(application)
+        await application.shutdown()
+        logger.info("Webhook server stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,33 @@
+"""
+Delivery worker: same background jobs as bot.py (outbox sending, and scheduling
+while it holds the leader lock) but without receiving Telegram updates.
+Run any number of these next to the bot to share the daily broadcast load.
+"""
+import signal
+import asyncio
+
+from bot import build_application, logger, post_init, post_shutdown
+
+
+async def run():
+    application = build_application(handlers=False)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    await post_init(application)
+    await application.start()
+    logger.info("Worker started ✅✨")
+    try:
+        await stop.wait()
+    finally:
+        await application.stop()
+        await post_shutdown(application)
+        await application.shutdown()
+        logger.info("Worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())